@@ -0,0 +1,98 @@
+"""
+⏱️ Compara los backends de texto de MuPDF (documento.BACKENDS_TEXTO) sobre PDFs reales
+y sobre documentos grandes sintéticos (las páginas del PDF repetidas N veces).
+
+Uso:
+    python benchmark_backends.py ../2.pdf --repeticiones 10 > ../bench_output.txt
+
+Por cada documento y backend mide la extracción de spans sola y la extracción completa
+(motor.extraer_datos_por_celdas) e indica cuántos registros difieren de los del
+backend "dict", que es la referencia
+"""
+import argparse
+import logging
+import time
+
+import fitz
+
+import motor
+from documento import BACKENDS_TEXTO, DocumentoPDF
+
+REFERENCIA = "dict"
+
+
+def documento_repetido(pdf_bytes, veces):
+    """PDF con las páginas de pdf_bytes repetidas veces (documento grande sintético)"""
+    origen = fitz.open(stream=pdf_bytes, filetype="pdf")
+    grande = fitz.open()
+    for _ in range(veces):
+        grande.insert_pdf(origen)
+    datos = grande.tobytes()
+    grande.close()
+    origen.close()
+    return datos
+
+
+def medir(func, rondas):
+    """Mejor tiempo (segundos) de rondas ejecuciones y el resultado de la última"""
+    mejor = None
+    for _ in range(rondas):
+        inicio = time.perf_counter()
+        resultado = func()
+        transcurrido = time.perf_counter() - inicio
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor, resultado
+
+
+def solo_spans(pdf_bytes, backend):
+    with DocumentoPDF(pdf_bytes, backend) as documento:
+        total = 0
+        for page_index in range(len(documento)):
+            total += len(documento.spans(page_index))
+            documento.descartar(page_index)
+        return total
+
+
+def extraccion_completa(pdf_bytes, backend):
+    with DocumentoPDF(pdf_bytes, backend) as documento:
+        return motor.extraer_datos_por_celdas(documento)
+
+
+def comparar(nombre, pdf_bytes, rondas):
+    with DocumentoPDF(pdf_bytes) as documento:
+        paginas = len(documento)
+    print(f"\n📄 {nombre} ({paginas} páginas)")
+    print(f"{'backend':<8} {'spans':>8} {'ms/pág spans':>13} {'ms/pág total':>13} {'registros':>10} {'distintos':>10}")
+
+    referencia = None
+    for backend in [REFERENCIA] + [b for b in BACKENDS_TEXTO if b != REFERENCIA]:
+        t_spans, spans = medir(lambda: solo_spans(pdf_bytes, backend), rondas)
+        t_total, registros = medir(lambda: extraccion_completa(pdf_bytes, backend), rondas)
+        if referencia is None:
+            referencia = registros
+        distintos = sum(1 for a, b in zip(referencia, registros) if a != b) + abs(len(referencia) - len(registros))
+        print(f"{backend:<8} {spans:>8} {t_spans / paginas * 1000:>13.2f} {t_total / paginas * 1000:>13.2f} "
+              f"{len(registros):>10} {distintos:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los backends de texto de MuPDF")
+    parser.add_argument("pdfs", nargs="*", default=["../2.pdf"], help="PDFs a medir")
+    parser.add_argument("--repeticiones", type=int, default=10,
+                        help="veces que se repiten las páginas en el documento sintético (0 = no generarlo)")
+    parser.add_argument("--rondas", type=int, default=3, help="ejecuciones por medida (se toma la mejor)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    for ruta in args.pdfs:
+        with open(ruta, "rb") as f:
+            pdf_bytes = f.read()
+        comparar(ruta, pdf_bytes, args.rondas)
+        if args.repeticiones > 1:
+            grande = documento_repetido(pdf_bytes, args.repeticiones)
+            comparar(f"{ruta} x{args.repeticiones}", grande, args.rondas)
+
+
+if __name__ == "__main__":
+    main()
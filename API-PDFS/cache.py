@@ -0,0 +1,134 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def clave_huella(sha256: str, firma: str) -> str:
+    """
+    Clave de cache: SHA-256 del contenido del PDF (calculado al volcar la subida a
+    disco) combinado con la firma de versión/configuración del extractor
+    """
+    return sha256 + "-" + firma
+
+
+class ResultCache:
+    """
+    Cache de resultados de extracción en dos niveles: LRU en memoria y, opcionalmente,
+    archivos JSON en disco con expulsión por tamaño total (los menos usados primero)
+    """
+
+    def __init__(self, max_items=64, directorio=None, max_bytes_disco=0):
+        self.max_items = max_items
+        self.directorio = directorio
+        self.max_bytes_disco = max_bytes_disco
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+
+        if self.directorio:
+            os.makedirs(self.directorio, exist_ok=True)
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave + ".json")
+
+    def get(self, clave):
+        with self._lock:
+            valor = self._memoria.get(clave)
+            if valor is not None:
+                self._memoria.move_to_end(clave)
+                self.hits_memoria += 1
+                return valor
+
+        valor = self._leer_disco(clave)
+        with self._lock:
+            if valor is None:
+                self.misses += 1
+                return None
+            self.hits_disco += 1
+        self._guardar_memoria(clave, valor)
+        return valor
+
+    def put(self, clave, valor):
+        self._guardar_memoria(clave, valor)
+        self._escribir_disco(clave, valor)
+
+    def _guardar_memoria(self, clave, valor):
+        if self.max_items <= 0:
+            return
+        with self._lock:
+            self._memoria[clave] = valor
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_items:
+                self._memoria.popitem(last=False)
+
+    def _leer_disco(self, clave):
+        if not self.directorio:
+            return None
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                valor = json.load(f)
+            # La fecha de modificación marca el último uso para la expulsión LRU
+            os.utime(ruta)
+            return valor
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️ Entrada de cache ilegible %s: %s", ruta, e)
+            return None
+
+    def _escribir_disco(self, clave, valor):
+        if not self.directorio:
+            return
+        ruta = self._ruta(clave)
+        temporal = ruta + ".tmp"
+        try:
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(valor, f, ensure_ascii=False)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            logger.warning("⚠️ No se pudo escribir la cache %s: %s", ruta, e)
+            return
+        self._expulsar_disco()
+
+    def _expulsar_disco(self):
+        """Borra las entradas menos usadas hasta quedar por debajo de max_bytes_disco"""
+        if self.max_bytes_disco <= 0:
+            return
+        entradas = []
+        total = 0
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith(".json"):
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                st = os.stat(ruta)
+            except OSError:
+                continue
+            entradas.append((st.st_mtime, st.st_size, ruta))
+            total += st.st_size
+
+        for _, tamano, ruta in sorted(entradas):
+            if total <= self.max_bytes_disco:
+                break
+            try:
+                os.remove(ruta)
+                total -= tamano
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits_memoria": self.hits_memoria,
+                "hits_disco": self.hits_disco,
+                "misses": self.misses,
+                "entradas_memoria": len(self._memoria),
+                "disco_habilitado": bool(self.directorio)
+            }
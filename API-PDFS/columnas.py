@@ -0,0 +1,112 @@
+import bisect
+
+import numpy as np
+
+_indices = {}
+
+# X a menos de esta distancia de un límite del índice se resuelven con buscar_columna_lineal:
+# los límites (x_min - tolerance, puntos medios...) se calculan en float y pueden quedar a un
+# error de redondeo del borde real de la regla, que compara distancias
+CERCANIA_LIMITE = 1e-6
+
+
+def buscar_columna_lineal(column_areas, x_pos):
+    """
+    Regla de referencia de find_column_by_position_corrected: primera área (en orden
+    de configuración) que contiene x_pos; si ninguna, la más cercana dentro de su
+    tolerancia (en empate gana la primera)
+    """
+    for col_name, area in column_areas.items():
+        if area["x_min"] <= x_pos <= area["x_max"]:
+            return col_name
+
+    mejor_columna = None
+    menor_distancia = float('inf')
+
+    for col_name, area in column_areas.items():
+        if x_pos < area["x_min"]:
+            distancia = area["x_min"] - x_pos
+        elif x_pos > area["x_max"]:
+            distancia = x_pos - area["x_max"]
+        else:
+            distancia = 0
+
+        if distancia <= area["tolerance"] and distancia < menor_distancia:
+            menor_distancia = distancia
+            mejor_columna = col_name
+
+    return mejor_columna
+
+
+class IndiceColumnas:
+    """
+    Índice de intervalos precompilado para asignar columnas por X. Los límites de
+    todas las áreas, sus bandas de tolerancia y los puntos medios entre áreas parten
+    el eje X en tramos donde la respuesta de buscar_columna_lineal es constante;
+    cada tramo guarda su columna y la búsqueda es un bisect / searchsorted en lugar
+    de recorrer todas las áreas. Sobre un límite (o a CERCANIA_LIMITE de él) se usa
+    la regla lineal, así el índice da siempre lo mismo que buscar_columna_lineal
+    """
+
+    def __init__(self, column_areas):
+        self.column_areas = column_areas
+        self.nombres = list(column_areas)
+        areas = list(column_areas.values())
+
+        puntos = set()
+        for area in areas:
+            puntos.update((area["x_min"], area["x_max"],
+                           area["x_min"] - area["tolerance"], area["x_max"] + area["tolerance"]))
+        # Donde la distancia a un área por la izquierda iguala la distancia a otra por la derecha
+        for derecha in areas:
+            for izquierda in areas:
+                if izquierda["x_max"] < derecha["x_min"]:
+                    puntos.add((izquierda["x_max"] + derecha["x_min"]) / 2)
+
+        self.puntos = sorted(float(p) for p in puntos)
+        codigo = {nombre: i for i, nombre in enumerate(self.nombres)}
+
+        def resolver(x):
+            col = buscar_columna_lineal(column_areas, x)
+            return -1 if col is None else codigo[col]
+
+        representantes = ([self.puntos[0] - 1] +
+                          [(a + b) / 2 for a, b in zip(self.puntos, self.puntos[1:])] +
+                          [self.puntos[-1] + 1])
+        self.en_tramo = [resolver(x) for x in representantes]
+
+        self._puntos = np.array(self.puntos, dtype=np.float64)
+        self._en_tramo = np.array(self.en_tramo, dtype=np.int64)
+
+    @classmethod
+    def para(cls, column_areas):
+        """Índice compartido para una configuración de áreas (se compila una sola vez)"""
+        clave = tuple((nombre, area["x_min"], area["x_max"], area["tolerance"])
+                      for nombre, area in column_areas.items())
+        indice = _indices.get(clave)
+        if indice is None:
+            indice = _indices[clave] = cls(column_areas)
+        return indice
+
+    def buscar(self, x_pos):
+        """Columna para una X (o None)"""
+        k = bisect.bisect_left(self.puntos, x_pos)
+        if ((k < len(self.puntos) and self.puntos[k] - x_pos <= CERCANIA_LIMITE)
+                or (k > 0 and x_pos - self.puntos[k - 1] <= CERCANIA_LIMITE)):
+            return buscar_columna_lineal(self.column_areas, x_pos)
+        codigo = self.en_tramo[k]
+        return None if codigo < 0 else self.nombres[codigo]
+
+    def buscar_todos(self, x):
+        """Columna para cada X del array en una sola operación; devuelve lista de nombres/None"""
+        x = np.asarray(x, dtype=np.float64)
+        k = np.searchsorted(self._puntos, x, side="left")
+        derecha = self._puntos[np.minimum(k, len(self._puntos) - 1)]
+        izquierda = self._puntos[np.maximum(k - 1, 0)]
+        cerca = (((k < len(self._puntos)) & (derecha - x <= CERCANIA_LIMITE))
+                 | ((k > 0) & (x - izquierda <= CERCANIA_LIMITE)))
+        nombres = self.nombres + [None]
+        columnas = [nombres[c] for c in self._en_tramo[k].tolist()]
+        for i in np.flatnonzero(cerca).tolist():
+            columnas[i] = buscar_columna_lineal(self.column_areas, float(x[i]))
+        return columnas
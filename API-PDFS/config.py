@@ -0,0 +1,43 @@
+import os
+
+# ⚙️ Configuración de ejecución (se puede sobreescribir con variables de entorno)
+
+# Modo de ejecución de la extracción: "process" (pool de procesos) o "thread"
+EXECUTION_MODE = os.getenv("PDF_EXECUTION_MODE", "process").lower()
+
+# Backend de extracción de texto de MuPDF: "dict" (spans de get_text("dict"), por defecto)
+# o "words" (palabras planas reagrupadas por línea: más barato, espacios repetidos reducidos a uno)
+TEXT_BACKEND = os.getenv("PDF_TEXT_BACKEND", "dict").lower()
+
+# Número de procesos del pool (0 = un proceso por núcleo)
+POOL_WORKERS = int(os.getenv("PDF_POOL_WORKERS", "0")) or os.cpu_count() or 1
+
+# Tareas que atiende cada proceso antes de reciclarse (0 = sin límite)
+POOL_MAX_TASKS_PER_CHILD = int(os.getenv("PDF_POOL_MAX_TASKS_PER_CHILD", "0")) or None
+
+# Tiempo máximo (segundos) de una extracción antes de responder con timeout
+JOB_TIMEOUT = float(os.getenv("PDF_JOB_TIMEOUT", "300"))
+
+# Documentos con al menos estas páginas se reparten por rangos entre los procesos del pool (0 = nunca)
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+
+# Modo streaming (NDJSON): páginas por trabajo enviado al pool
+STREAM_PAGES_PER_JOB = max(1, int(os.getenv("PDF_STREAM_PAGES_PER_JOB", "2")))
+
+# Subidas: se vuelcan por bloques a un archivo temporal y se extraen por ruta
+UPLOAD_MAX_BYTES = int(os.getenv("PDF_UPLOAD_MAX_BYTES", str(200 * 1024 * 1024)))  # 0 = sin límite
+UPLOAD_CHUNK_BYTES = max(1, int(os.getenv("PDF_UPLOAD_CHUNK_BYTES", str(1024 * 1024))))
+UPLOAD_TMP_DIR = os.getenv("PDF_UPLOAD_TMP_DIR", "")                    # vacío = directorio temporal del sistema
+
+# /extract-batch: máximo de PDFs por petición (archivos sueltos más los de los ZIP) y de
+# bytes en total (el cuerpo de la petición y lo que ocupan los PDFs ya extraídos de los ZIP)
+BATCH_MAX_FILES = int(os.getenv("PDF_BATCH_MAX_FILES", "500"))
+BATCH_MAX_BYTES = int(os.getenv("PDF_BATCH_MAX_BYTES", str(1024 * 1024 * 1024)))  # 0 = sin límite
+
+# Cache de resultados por contenido (SHA-256 del PDF + versión/configuración del extractor)
+CACHE_MAX_ITEMS = int(os.getenv("PDF_CACHE_MAX_ITEMS", "64"))          # 0 = sin cache en memoria
+CACHE_DIR = os.getenv("PDF_CACHE_DIR", "")                              # vacío = sin cache en disco
+CACHE_MAX_DISK_BYTES = int(os.getenv("PDF_CACHE_MAX_DISK_BYTES", str(512 * 1024 * 1024)))
+
+# Layouts calibrados por plantilla (huella de los encabezados de columna) que guarda cada proceso
+LAYOUT_CACHE_MAX_ITEMS = int(os.getenv("PDF_LAYOUT_CACHE_MAX_ITEMS", "128"))
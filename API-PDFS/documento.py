@@ -0,0 +1,127 @@
+import fitz
+
+import config
+
+
+def _spans_dict(page, clip):
+    """Spans tal cual los agrupa MuPDF (blocks → lines → spans de get_text("dict"))"""
+    spans = []
+    for block in page.get_text("dict", clip=clip).get("blocks", []):
+        if "lines" not in block:
+            continue
+        for line in block["lines"]:
+            for span in line["spans"]:
+                x0, y0, x1, y1 = span["bbox"]
+                spans.append((span["text"], x0, y0, x1, y1))
+    return spans
+
+
+def _spans_words(page, clip):
+    """
+    Tuplas planas de get_text("words") (sin fuentes, colores, orígenes ni imágenes)
+    reagrupadas por línea: un span por línea con sus palabras unidas por un espacio y
+    el bbox de la línea. Los espacios repetidos se reducen a uno y una línea con
+    varias fuentes forma un solo span
+    """
+    lineas = {}
+    for x0, y0, x1, y1, palabra, bloque, linea, _ in page.get_text("words", clip=clip):
+        actual = lineas.get((bloque, linea))
+        if actual is None:
+            lineas[(bloque, linea)] = [[palabra], x0, y0, x1, y1]
+        else:
+            actual[0].append(palabra)
+            actual[1] = min(actual[1], x0)
+            actual[2] = min(actual[2], y0)
+            actual[3] = max(actual[3], x1)
+            actual[4] = max(actual[4], y1)
+    return [(" ".join(palabras), x0, y0, x1, y1) for palabras, x0, y0, x1, y1 in lineas.values()]
+
+
+# Backends de extracción de texto (config.TEXT_BACKEND)
+BACKENDS_TEXTO = {
+    "dict": _spans_dict,
+    "words": _spans_words,
+}
+
+
+def spans_de_pagina(page, franja=None, backend=None):
+    """
+    Una sola pasada de MuPDF aplanada a tuplas (texto, x0, y0, x1, y1).
+    El texto y el bbox se conservan sin limpiar para que cada consumidor aplique su filtro.
+    franja (y0, y1): MuPDF solo extrae los spans contenidos en esa franja horizontal.
+    backend: "dict" o "words" (ver BACKENDS_TEXTO); por defecto config.TEXT_BACKEND
+    """
+    backend = backend or config.TEXT_BACKEND
+    if backend not in BACKENDS_TEXTO:
+        raise KeyError(f"Backend de texto desconocido: {backend}")
+
+    clip = None
+    if franja is not None:
+        rect = page.rect
+        clip = fitz.Rect(rect.x0, max(franja[0], rect.y0), rect.x1, min(franja[1], rect.y1))
+
+    return BACKENDS_TEXTO[backend](page, clip)
+
+
+class DocumentoPDF:
+    """
+    Sesión de un PDF para una petición: el documento se abre una sola vez y los
+    spans de cada página se extraen una sola vez y se comparten entre la
+    detección de CODI, la detección de headers y la construcción de elementos
+    """
+
+    def __init__(self, pdf, backend=None):
+        # Bytes en memoria o ruta del archivo (MuPDF lee del disco lo que necesita)
+        if isinstance(pdf, (bytes, bytearray, memoryview)):
+            self.doc = fitz.open(stream=pdf, filetype="pdf")
+        else:
+            self.doc = fitz.open(pdf, filetype="pdf")
+        self.backend = backend or config.TEXT_BACKEND
+        self._spans = {}
+
+    def __len__(self):
+        return len(self.doc)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def load_page(self, page_index):
+        return self.doc.load_page(page_index)
+
+    def spans(self, page_index, franja=None):
+        """
+        Spans de la página (índice base 0), extraídos una sola vez. Con franja (y0, y1)
+        solo los contenidos en ella: si la página ya se extrajo completa se filtra esa
+        extracción; si no, se extrae solo la franja (sin cachear: la cache es de páginas completas)
+        """
+        spans = self._spans.get(page_index)
+        if franja is not None:
+            if spans is None:
+                return spans_de_pagina(self.load_page(page_index), franja, self.backend)
+            y_min, y_max = franja
+            return [span for span in spans if span[2] >= y_min and span[4] <= y_max]
+        if spans is None:
+            spans = spans_de_pagina(self.load_page(page_index), backend=self.backend)
+            self._spans[page_index] = spans
+        return spans
+
+    def descartar(self, page_index):
+        """Libera los spans cacheados de una página que ya no se va a consultar"""
+        self._spans.pop(page_index, None)
+
+    def close(self):
+        self._spans.clear()
+        self.doc.close()
+
+
+def abrir_documento(pdf):
+    """
+    Acepta bytes, la ruta del archivo o un DocumentoPDF ya abierto. Devuelve (documento, propio);
+    si propio es True el llamador debe cerrarlo al terminar
+    """
+    if isinstance(pdf, DocumentoPDF):
+        return pdf, False
+    return DocumentoPDF(pdf), True
@@ -0,0 +1,303 @@
+import hashlib
+import logging
+import math
+import statistics
+import threading
+from collections import Counter, OrderedDict
+
+import config
+from perfiles import ETIQUETAS_COLUMNA, PERFIL_CODI, PERFIL_DEFECTO, elegir_perfil, obtener_perfil
+
+logger = logging.getLogger(__name__)
+
+# Mínimo de etiquetas en una fila para tomarla como fila de encabezados de la tabla
+MIN_ETIQUETAS_FILA = 3
+# Diferencia máxima de Y (en puntos) entre etiquetas de una misma fila de encabezados
+TOLERANCIA_FILA = 3.0
+# Mínimo de columnas con encabezado reconocido para calibrar; con menos se usan las bandas estáticas
+MIN_COLUMNAS_CALIBRACION = 3
+# Desplazamientos menores (en puntos) se consideran ruido de la plantilla: no se calibra
+DESPLAZAMIENTO_MINIMO = 1.0
+
+# Textos de encabezado de columna (normalizados) que identifican una plantilla de cédula
+ETIQUETAS_ENCABEZADO = {
+    "PROG", "DESCRIPCION", "PROG DESCRIPCION", "OBSERVACIONES", "MARCA", "MODELO",
+    "SERIE", "COSTO", "COSTO DEL BIEN", "TIPO ADQ", "DESC. TIPO ADQ", "NO. INVENTARIO", "CODI",
+}
+
+# Detección de CODI por contenido (páginas sin fila de encabezados)
+Y_ZONA_HEADERS = 150
+TITULOS_COLUMNA = ["PROG", "DESCRIPCION", "OBSERVACIONES", "MARCA", "MODELO"]
+VALORES_CODI = {"000", "0000", "00"}
+
+# Recorte de la extracción a la región de la tabla
+# Inicio (normalizado) de los textos del pie que cierran la tabla
+PIES_TABLA = ("TOTAL POR TIPO", "TOTAL CEDULA", "TOTAL CÉDULA", "DECLARO BAJO PROTESTA")
+# Margen (en puntos) por encima de la fila de encabezados y por debajo del pie
+MARGEN_REGION = 2.0
+# Diferencia máxima de altura de la fila de encabezados entre páginas de una misma plantilla
+TOLERANCIA_FILA_ENCABEZADOS = 1.0
+
+
+def analizar_pagina(spans):
+    """
+    Una sola pasada por los spans de la página. Devuelve (encabezados, codi, y_encabezados):
+      encabezados:   [(etiqueta, x0)] de la fila con más etiquetas de columna conocidas
+                     (la fila de títulos de la tabla; etiquetas a menos de TOLERANCIA_FILA
+                     en Y), ordenados por X; lista vacía si ninguna fila tiene
+                     MIN_ETIQUETAS_FILA etiquetas
+      codi:          si el contenido indica columna CODI: "CODI" en la zona de headers o en
+                     la línea de headers, o al menos 3 valores 000/0000/00 con 2 en la
+                     misma franja de 20pt en X (para páginas sin fila de encabezados)
+      y_encabezados: Y superior de esa fila (None si no hay fila de encabezados)
+    """
+    candidatos = []
+    codi = False
+    y_titulos = set()
+    y_codi_datos = []
+    valores_codi = 0
+    franjas_codi = Counter()
+
+    for texto, x0, y0, _, _ in spans:
+        texto = texto.strip().upper()
+        etiqueta = texto.rstrip(".:").strip()
+        if etiqueta in ETIQUETAS_ENCABEZADO:
+            candidatos.append((y0, x0, etiqueta))
+
+        if y0 < Y_ZONA_HEADERS:
+            if any(titulo in texto for titulo in TITULOS_COLUMNA):
+                y_titulos.add(round(y0))
+            elif "CODI" in texto and len(texto) <= 6:
+                codi = True
+        elif y0 > Y_ZONA_HEADERS:
+            if "CODI" in texto and len(texto) <= 6:
+                y_codi_datos.append(y0)
+            elif texto in VALORES_CODI:
+                valores_codi += 1
+                franjas_codi[round(x0 / 20) * 20] += 1
+
+    if not codi and y_titulos:
+        codi = any(abs(y - y_titulo) <= 10 for y in y_codi_datos for y_titulo in y_titulos)
+    if not codi and valores_codi >= 3:
+        codi = max(franjas_codi.values()) >= 2
+
+    fila = max(filas_de_etiquetas(candidatos), key=len, default=[])
+    if len(fila) < MIN_ETIQUETAS_FILA:
+        return [], codi, None
+    encabezados = sorted(((etiqueta, x0) for _, x0, etiqueta in fila), key=lambda e: e[1])
+    return encabezados, codi, fila[0][0]
+
+
+def filas_de_etiquetas(candidatos):
+    """
+    Agrupa las etiquetas (y0, x0, etiqueta) en filas: cada fila empieza en la etiqueta
+    más alta que queda y reúne las que están a menos de TOLERANCIA_FILA por debajo (sin
+    cortes por redondeo cuando la plantilla cae cerca de media unidad)
+    """
+    filas = []
+    for candidato in sorted(candidatos):
+        if filas and candidato[0] - filas[-1][0][0] <= TOLERANCIA_FILA:
+            filas[-1].append(candidato)
+        else:
+            filas.append([candidato])
+    return filas
+
+
+def huella_layout(encabezados):
+    """Huella de la plantilla: etiquetas de encabezado y su X redondeada al punto"""
+    clave = "|".join(f"{etiqueta}@{round(x0)}" for etiqueta, x0 in encabezados)
+    return hashlib.sha1(clave.encode()).hexdigest()[:16]
+
+
+def calibrar_layout(perfil, encabezados):
+    """
+    Bandas de columna para una plantilla a partir de sus encabezados. Cada columna se
+    desplaza lo que su encabezado se aleja del de la plantilla de referencia del perfil;
+    las columnas sin encabezado reconocido usan la mediana de los desplazamientos.
+    Sin referencia o con pocos encabezados se usan las bandas estáticas del perfil
+    """
+    posiciones = dict(encabezados)
+    desplazamientos = {}
+    for columna, etiquetas in ETIQUETAS_COLUMNA.items():
+        for etiqueta in etiquetas:
+            if etiqueta in posiciones and etiqueta in perfil.encabezados:
+                desplazamientos[columna] = posiciones[etiqueta] - perfil.encabezados[etiqueta]
+                break
+
+    if len(desplazamientos) < MIN_COLUMNAS_CALIBRACION:
+        return perfil
+
+    mediana = statistics.median(desplazamientos.values())
+    for columna in perfil.column_config:
+        desplazamientos.setdefault(columna, mediana)
+
+    if all(abs(dx) < DESPLAZAMIENTO_MINIMO for dx in desplazamientos.values()):
+        return perfil
+
+    desplazamientos = {columna: round(dx, 1) for columna, dx in desplazamientos.items()}
+    logger.info("📐 Bandas calibradas desde encabezados (perfil %s): %s", perfil.nombre, desplazamientos)
+    return perfil.desplazado(desplazamientos)
+
+
+class CacheLayouts:
+    """
+    Layouts calibrados por (perfil, huella de plantilla, CODI por contenido), LRU y
+    compartida por todas las páginas y documentos que procesa el proceso
+    """
+
+    def __init__(self, max_items=128):
+        self.max_items = max_items
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, perfil, encabezados, codi=False):
+        """
+        perfil=None: el perfil se elige por las etiquetas de los encabezados y, si el
+        contenido de la página indica columna CODI (codi de analizar_pagina), como si
+        la fila tuviera la etiqueta CODI aunque no esté en ella
+        """
+        codi = codi and perfil is None
+        clave = (perfil.nombre if perfil else None, huella_layout(encabezados), codi)
+        with self._lock:
+            layout = self._layouts.get(clave)
+            if layout is not None:
+                self._layouts.move_to_end(clave)
+                return layout
+
+        if perfil is None:
+            etiquetas = {etiqueta for etiqueta, _ in encabezados}
+            if codi:
+                etiquetas.add("CODI")
+            perfil = obtener_perfil(elegir_perfil(etiquetas))
+        layout = calibrar_layout(perfil, encabezados)
+        logger.debug("📐 Plantilla nueva %s (perfil %s): %s encabezados", clave[1], perfil.nombre, len(encabezados))
+
+        with self._lock:
+            self._layouts[clave] = layout
+            while len(self._layouts) > self.max_items:
+                self._layouts.popitem(last=False)
+        return layout
+
+
+cache_layouts = CacheLayouts(config.LAYOUT_CACHE_MAX_ITEMS)
+
+
+def perfil_por_contenido(codi):
+    return obtener_perfil(PERFIL_CODI if codi else PERFIL_DEFECTO)
+
+
+def resolver_layout(perfil, analisis, anterior=None):
+    """
+    Layout de una página (analisis: resultado de analizar_pagina): el de su plantilla
+    (desde la cache) si la página tiene fila de encabezados; si no, el de la página
+    anterior del documento, el perfil indicado o el que indique el contenido de la
+    página (CODI). perfil=None elige el perfil por los encabezados de cada plantilla
+    """
+    encabezados, codi, _ = analisis
+    if encabezados:
+        return cache_layouts.obtener(perfil, encabezados, codi)
+    return anterior or perfil or perfil_por_contenido(codi)
+
+
+def pie_tabla(texto):
+    """Inicio de PIES_TABLA con el que empieza el texto (None si no es un texto de pie)"""
+    normalizado = texto.strip().lstrip('"').upper()
+    for pie in PIES_TABLA:
+        if normalizado.startswith(pie):
+            return pie
+    return None
+
+
+def region_tabla(spans, y_encabezados):
+    """
+    Franja (y0, y1) de la página que ocupa la tabla y el pie que la cierra: desde la
+    fila de encabezados hasta el último texto de pie (TOTAL POR TIPO..., Declaro bajo
+    protesta...) por debajo, incluido; sin pie, hasta el final de la página (pie None).
+    Todo el ancho: las bandas de columna se calibran en X y no se recortan
+    """
+    fin, cierre, y_cierre = math.inf, None, y_encabezados
+    for texto, _, y0, _, y1 in spans:
+        if y0 > y_cierre:
+            pie = pie_tabla(texto)
+            if pie:
+                fin, cierre, y_cierre = y1 + MARGEN_REGION, pie, y0
+    return (y_encabezados - MARGEN_REGION, fin), cierre
+
+
+class RecorteTabla:
+    """
+    Región de la tabla de la plantilla en curso de un documento, para que MuPDF solo
+    extraiga esa franja en las páginas siguientes (sin títulos ni firmas). Se determina
+    una vez por plantilla, con la primera página completa en la que aparece; una página
+    recortada que no muestre la misma fila de encabezados a la misma altura, o que no
+    llegue al pie que cerraba la tabla (p.ej. una tabla más larga que la de esa primera
+    página), se vuelve a extraer completa (ver motor.iter_paginas_registros)
+    """
+
+    def __init__(self):
+        self.huella = None
+        self.y_encabezados = None
+        self.franja = None
+        self.pie = None
+
+    def actualizar(self, spans, analisis, forzar=False):
+        """
+        Desde una página extraída completa: fija la región de su plantilla (o ninguna).
+        forzar: la franja anterior no sirvió para esta página (valida): se recalcula
+        aunque la plantilla sea la misma, para no pagar dos extracciones en las siguientes
+        """
+        encabezados, _, y_encabezados = analisis
+        if not encabezados:
+            self.huella = self.y_encabezados = self.franja = self.pie = None
+            return
+        huella = huella_layout(encabezados)
+        if (forzar or huella != self.huella
+                or abs(y_encabezados - self.y_encabezados) > TOLERANCIA_FILA_ENCABEZADOS):
+            self.huella = huella
+            self.y_encabezados = y_encabezados
+            self.franja, self.pie = region_tabla(spans, y_encabezados)
+            logger.debug("✂️ Región de la tabla (plantilla %s): y %.1f-%.1f", huella, *self.franja)
+
+    def valida(self, spans, analisis):
+        """
+        Si una página extraída con la franja muestra la fila de encabezados de la
+        plantilla y, si la tabla se cerraba con un pie, ese mismo pie dentro de la franja
+        """
+        encabezados, _, y_encabezados = analisis
+        return (
+            bool(encabezados)
+            and huella_layout(encabezados) == self.huella
+            and abs(y_encabezados - self.y_encabezados) <= TOLERANCIA_FILA_ENCABEZADOS
+            and (self.pie is None or any(
+                y0 > y_encabezados and pie_tabla(texto) == self.pie for texto, _, y0, _, _ in spans
+            ))
+        )
+
+
+def descriptor_layout(layout):
+    """(perfil, desplazamientos) de un layout: serializable, para enviarlo a los procesos del pool"""
+    return layout.nombre, dict(layout.desplazamientos)
+
+
+def layout_desde_descriptor(descriptor):
+    """Layout de un descriptor_layout (None si no hay descriptor)"""
+    if descriptor is None:
+        return None
+    nombre, desplazamientos = descriptor
+    perfil = obtener_perfil(nombre)
+    return perfil.desplazado(desplazamientos) if desplazamientos else perfil
+
+
+def layout_documento(doc, max_paginas=2):
+    """
+    Layout con el que empieza el documento: el de la primera fila de encabezados de las
+    primeras páginas o, si no hay, el perfil que indique su contenido (spans compartidos
+    con la extracción: no es una pasada extra por el documento)
+    """
+    codi = False
+    for page_index in range(min(max_paginas, len(doc))):
+        encabezados, codi_pagina, _ = analizar_pagina(doc.spans(page_index))
+        codi = codi or codi_pagina
+        if encabezados:
+            return cache_layouts.obtener(None, encabezados, codi)
+    return perfil_por_contenido(codi)
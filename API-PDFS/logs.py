@@ -0,0 +1,37 @@
+import logging
+import os
+import sys
+
+# 📝 Niveles de log (se pueden sobreescribir con variables de entorno)
+#   PDF_LOG_LEVEL:  nivel global (por defecto INFO)
+#   PDF_LOG_LEVELS: niveles por módulo, p.ej. "motor=DEBUG,pipeline=WARNING"
+# La traza por span/fila del motor de extracción está en DEBUG: en producción no se formatea
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+_configurado = False
+
+
+def _nivel(nombre):
+    nivel = logging.getLevelName(nombre.strip().upper())
+    return nivel if isinstance(nivel, int) else logging.INFO
+
+
+def configurar_logging():
+    """Configura el handler y los niveles por módulo (una vez por proceso)"""
+    global _configurado
+
+    if _configurado:
+        return
+    _configurado = True
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(_nivel(os.getenv("PDF_LOG_LEVEL", "INFO")))
+
+    for par in os.getenv("PDF_LOG_LEVELS", "").split(","):
+        if "=" in par:
+            modulo, nivel = par.split("=", 1)
+            logging.getLogger(modulo.strip()).setLevel(_nivel(nivel))
@@ -1,110 +1,170 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
-import io
-import fitz
-import re
-from extractor_filtro_2 import extraer_datos_por_celdas as extraer_con_codi
-from extractor import extraer_datos_por_celdas as extraer_sin_codi
+import asyncio
+import hashlib
+import json
+import logging
+from contextlib import aclosing, asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+import config
+from cache import ResultCache, clave_huella
+from logs import configurar_logging
+from pipeline import (
+    EstadisticasExtraccion, PaginasInvalidas, firma_configuracion, metodo_extraccion, parsear_paginas,
+)
+from registros import registros_a_dicts
+from subidas import ArchivoDemasiadoGrande, LoteDemasiadoGrande, guardar_subida, guardar_zip
+from workers import ExtractionTimeout, iniciar_documento, iterar_paginas, procesar_documento, shutdown_executor
+
+configurar_logging()
+logger = logging.getLogger(__name__)
+
+cache_resultados = ResultCache(
+    max_items=config.CACHE_MAX_ITEMS,
+    directorio=config.CACHE_DIR or None,
+    max_bytes_disco=config.CACHE_MAX_DISK_BYTES
+)
+FIRMA_EXTRACTOR = firma_configuracion()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    shutdown_executor()
 
 app = FastAPI(
     title="PDF Table Extractor API",
     description="API para extraer datos de tablas PDF usando mapeo por áreas",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
-def detect_codi_column(pdf_bytes: bytes) -> bool:
+# Margen para las cabeceras multipart al comparar Content-Length con config.UPLOAD_MAX_BYTES
+MARGEN_MULTIPART = 64 * 1024
+
+@app.middleware("http")
+async def limitar_tamano_subida(request: Request, call_next):
+    """Rechaza con 413, sin leer el cuerpo, las subidas que declaran un tamaño mayor al permitido"""
+    longitud = request.headers.get("content-length", "")
+    if longitud.isdigit():
+        if (request.url.path == "/extract-table" and config.UPLOAD_MAX_BYTES
+                and int(longitud) > config.UPLOAD_MAX_BYTES + MARGEN_MULTIPART):
+            return _respuesta_demasiado_grande("El archivo supera el tamaño máximo permitido", None)
+        if (request.url.path == "/extract-batch" and config.BATCH_MAX_BYTES
+                and int(longitud) > config.BATCH_MAX_BYTES + MARGEN_MULTIPART):
+            return _respuesta_lote_demasiado_grande("El lote supera el tamaño máximo permitido")
+    return await call_next(request)
+
+def _respuesta_demasiado_grande(error, filename):
+    return JSONResponse(
+        status_code=413,
+        content={
+            "success": False,
+            "error": error,
+            "message": f"El tamaño máximo de archivo es {config.UPLOAD_MAX_BYTES} bytes",
+            "filename": filename or "unknown"
+        }
+    )
+
+def _respuesta_lote_demasiado_grande(error):
+    mensaje = f"El máximo de archivos por lote es {config.BATCH_MAX_FILES}"
+    if config.BATCH_MAX_BYTES:
+        mensaje += f" y el tamaño máximo del lote es {config.BATCH_MAX_BYTES} bytes"
+    return JSONResponse(
+        status_code=413,
+        content={"success": False, "error": error, "message": mensaje}
+    )
+
+def _linea_ndjson(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False) + "\n"
+
+def _firma_peticion(paginas, max_registros) -> str:
+    """Firma de cache de la petición: la del extractor y, si se piden, las páginas y el cupo de registros"""
+    if paginas is None and max_registros is None:
+        return FIRMA_EXTRACTOR
+    seleccion = json.dumps([paginas, max_registros])
+    return FIRMA_EXTRACTOR + "-" + hashlib.sha256(seleccion.encode()).hexdigest()[:12]
+
+async def _extraer_con_cache(filename, subida, paginas=None, max_registros=None) -> dict:
+    """Resultado de extracción (método, estadísticas y registros como dicts) de un PDF subido"""
+    # ♻️ Mismo contenido + misma versión/configuración → resultado cacheado
+    # (SHA-256 calculado al volcar la subida)
+    clave = clave_huella(subida.sha256, _firma_peticion(paginas, max_registros))
+    resultado = await run_in_threadpool(cache_resultados.get, clave)
+
+    if resultado is not None:
+        logger.info("♻️ Resultado en cache para: %s", filename)
+        return resultado
+
+    # 🎯 Detección CODI + extracción fuera del event loop (pool de procesos,
+    # repartiendo las páginas entre procesos en documentos grandes)
+    procesado = await procesar_documento(subida.ruta, paginas, max_registros)
+    resultado = {
+        "extraction_method": procesado["extraction_method"],
+        "statistics": procesado["statistics"],
+        "data": registros_a_dicts(procesado["data"])
+    }
+    await run_in_threadpool(cache_resultados.put, clave, resultado)
+    return resultado
+
+async def _stream_registros(filename, subida, info, max_registros=None):
     """
-    Detecta si el PDF tiene columna CODI analizando las primeras páginas
+    Un registro por línea a medida que terminan las páginas y una línea final con estadísticas.
+    Con max_registros deja de pedir páginas al alcanzar el cupo (los trabajos pendientes se cancelan).
+    Al terminar (o si el cliente se desconecta) se borra el temporal de la subida
     """
+    tiene_codi = info["tiene_codi"]
+    estadisticas = EstadisticasExtraccion(tiene_codi)
+
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        
-        # Analizar solo las primeras 2 páginas para eficiencia
-        max_pages = min(2, len(doc))
-        
-        for page_num in range(max_pages):
-            page = doc.load_page(page_num)
-            text_dict = page.get_text("dict")
-            
-            # Buscar headers de columnas
-            header_elements = []
-            data_elements = []
-            
-            for block in text_dict.get("blocks", []):
-                if "lines" in block:
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            texto = span["text"].strip().upper()
-                            y_pos = span["bbox"][1]
-                            x_pos = span["bbox"][0]
-                            
-                            # Detectar headers (posición Y superior)
-                            if y_pos < 150:  # Área de headers
-                                if any(header in texto for header in ["PROG", "DESCRIPCION", "OBSERVACIONES", "MARCA", "MODELO"]):
-                                    header_elements.append((texto, x_pos, y_pos))
-                                elif "CODI" in texto and len(texto) <= 6:
-                                    print(f"🎯 CODI detectado en header: '{texto}' en posición X={x_pos}, Y={y_pos}")
-                                    doc.close()
-                                    return True
-                            
-                            # Detectar datos (posición Y media/baja)
-                            elif y_pos > 150:
-                                data_elements.append((texto, x_pos, y_pos))
-            
-            # Si encontramos headers, buscar CODI en la misma línea Y
-            if header_elements:
-                header_y_positions = set(round(elem[2]) for elem in header_elements)
-                
-                for texto, x_pos, y_pos in data_elements:
-                    if any(abs(y_pos - header_y) <= 10 for header_y in header_y_positions):
-                        if "CODI" in texto and len(texto) <= 6:
-                            print(f"🎯 CODI detectado en línea de headers: '{texto}' en X={x_pos}, Y={y_pos}")
-                            doc.close()
-                            return True
-            
-            # Buscar patrones de datos CODI (valores 000, 0000, 00)
-            codi_pattern_count = 0
-            for texto, x_pos, y_pos in data_elements:
-                if texto in ["000", "0000", "00"] and y_pos > 150:
-                    codi_pattern_count += 1
-            
-            # Si hay muchos valores 000/0000/00 en posiciones similares, probablemente hay columna CODI
-            if codi_pattern_count >= 3:
-                print(f"🎯 Patrones CODI detectados: {codi_pattern_count} valores '000'/'0000'/'00'")
-                
-                # Verificar que estén en la misma columna X (agrupados)
-                codi_x_positions = []
-                for texto, x_pos, y_pos in data_elements:
-                    if texto in ["000", "0000", "00"] and y_pos > 150:
-                        codi_x_positions.append(x_pos)
-                
-                if codi_x_positions:
-                    # Si la mayoría están en posiciones X similares, es una columna
-                    x_groups = {}
-                    for x in codi_x_positions:
-                        key = round(x / 20) * 20  # Agrupar por cada 20px
-                        x_groups[key] = x_groups.get(key, 0) + 1
-                    
-                    max_group_count = max(x_groups.values())
-                    if max_group_count >= 2:  # Al menos 2 en la misma columna
-                        print(f"🎯 Columna CODI confirmada: {max_group_count} valores agrupados")
-                        doc.close()
-                        return True
-        
-        doc.close()
-        print("❌ No se detectó columna CODI")
-        return False
-        
+        async with aclosing(iterar_paginas(subida.ruta, info["seleccion"], info["layout"])) as paginas:
+            async for page_num, registros in paginas:
+                if max_registros is not None:
+                    registros = registros[:max_registros - estadisticas.total_registros]
+                for registro in registros:
+                    estadisticas.agregar(registro)
+                    yield _linea_ndjson({"type": "record", "page": page_num, "data": registro.a_dict()})
+                if max_registros is not None and estadisticas.total_registros >= max_registros:
+                    break
+
+        yield _linea_ndjson({
+            "type": "statistics",
+            "success": True,
+            "filename": filename,
+            "extraction_method": metodo_extraccion(tiene_codi),
+            "statistics": estadisticas.resultado()
+        })
     except Exception as e:
-        print(f"❌ Error detectando CODI: {str(e)}")
-        return False  # En caso de error, asumir que no hay CODI
+        # La respuesta ya empezó (HTTP 200): el error se informa como última línea
+        logger.error("❌ Error procesando %s: %s", filename, e)
+        yield _linea_ndjson({
+            "type": "error",
+            "success": False,
+            "error": str(e),
+            "message": "Error al procesar el archivo PDF",
+            "filename": filename
+        })
+    finally:
+        subida.eliminar()
 
 @app.post("/extract-table")
-async def extract_table(file: UploadFile = File(...)):
+async def extract_table(
+    file: UploadFile = File(...),
+    stream: bool = False,
+    pages: Optional[str] = None,
+    max_records: Optional[int] = Query(None, ge=1),
+):
     """
-    Extrae datos de tabla de un archivo PDF usando el extractor apropiado según la presencia de columna CODI
+    Extrae datos de tabla de un archivo PDF usando el extractor apropiado según la presencia de columna CODI.
+    Con stream=true responde NDJSON: una línea por registro según terminan las páginas y una línea final con estadísticas.
+    pages="1-5,8" procesa solo esas páginas; max_records=N deja de procesar páginas al reunir N registros
     """
+    subida = None
     try:
+        # Rangos de páginas pedidos (None = todo el documento)
+        paginas = parsear_paginas(pages)
+        
         # Validar tipo de archivo
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(
@@ -112,49 +172,67 @@ async def extract_table(file: UploadFile = File(...)):
                 detail="Solo se permiten archivos PDF"
             )
         
-        # Leer el archivo PDF
-        pdf_bytes = await file.read()
+        # 📥 Volcar la subida a un temporal por bloques (nunca entera en memoria);
+        # la extracción abre el PDF por ruta
+        subida = await run_in_threadpool(guardar_subida, file.file)
         
-        if not pdf_bytes:
+        if not subida.tamano:
             raise HTTPException(
                 status_code=400,
                 detail="El archivo está vacío"
             )
         
-        print(f"🚀 Iniciando análisis de: {file.filename}")
+        logger.info("🚀 Iniciando análisis de: %s", file.filename)
         
-        # 🎯 DETECTAR COLUMNA CODI
-        tiene_codi = detect_codi_column(pdf_bytes)
-        
-        if tiene_codi:
-            print("📊 Columna CODI detectada → Usando extractor_filtro_2.py")
-            extraction_method = "Area Mapping + CODI Filter (extractor_filtro_2.py)"
-            resultados = extraer_con_codi(pdf_bytes)
-        else:
-            print("📊 Sin columna CODI → Usando extractor.py")
-            extraction_method = "Area Mapping Standard (extractor.py)"
-            resultados = extraer_sin_codi(pdf_bytes)
+        if stream:
+            # El layout se resuelve antes de responder para poder devolver errores con su código HTTP
+            info = await iniciar_documento(subida.ruta, paginas)
+            respuesta = StreamingResponse(
+                _stream_registros(file.filename, subida, info, max_records),
+                media_type="application/x-ndjson",
+                background=BackgroundTask(subida.eliminar)
+            )
+            # El temporal lo borra la respuesta al terminar
+            subida = None
+            return respuesta
         
-        # Estadísticas de extracción
-        stats = {
-            "total_registros": len(resultados),
-            "registros_con_inventario": len([r for r in resultados if r.get("NO. INVENTARIO")]),
-            "registros_con_prog": len([r for r in resultados if r.get("PROG")]),
-            "columnas_extraidas": list(set().union(*[r.keys() for r in resultados])) if resultados else [],
-            "tiene_columna_codi": tiene_codi,
-            "archivo_extractor": "extractor_filtro_2.py" if tiene_codi else "extractor.py"
-        }
+        resultado = await _extraer_con_cache(file.filename, subida, paginas, max_records)
         
         return {
             "success": True,
             "filename": file.filename,
-            "extraction_method": extraction_method,
-            "statistics": stats,
-            "data": resultados
+            "extraction_method": resultado["extraction_method"],
+            "statistics": resultado["statistics"],
+            "data": resultado["data"]
         }
         
+    except ArchivoDemasiadoGrande as e:
+        logger.warning("⚠️ Archivo demasiado grande: %s", file.filename)
+        return _respuesta_demasiado_grande(str(e), file.filename)
+    except PaginasInvalidas as e:
+        logger.warning("⚠️ Páginas inválidas para %s: %s", file.filename, e)
+        return JSONResponse(
+            status_code=400,
+            content={
+                "success": False,
+                "error": str(e),
+                "message": "El parámetro pages no es válido para este documento",
+                "filename": file.filename if file else "unknown"
+            }
+        )
+    except ExtractionTimeout as e:
+        logger.warning("⏱️ Timeout procesando %s: %s", file.filename, e)
+        return JSONResponse(
+            status_code=504,
+            content={
+                "success": False,
+                "error": str(e),
+                "message": "El procesamiento del PDF excedió el tiempo máximo",
+                "filename": file.filename if file else "unknown"
+            }
+        )
     except Exception as e:
-        print(f"❌ Error procesando {file.filename}: {str(e)}")
+        logger.error("❌ Error procesando %s: %s", file.filename, e)
         return JSONResponse(
             status_code=500,
             content={
@@ -164,6 +242,139 @@ async def extract_table(file: UploadFile = File(...)):
                 "filename": file.filename if file else "unknown"
             }
         )
+    finally:
+        if subida is not None:
+            subida.eliminar()
+
+def _bytes_lote(archivos):
+    """Bytes ya volcados a disco por los archivos del lote"""
+    return sum(subida.tamano for _, subida, _ in archivos if subida is not None)
+
+def _eliminar_subidas(archivos):
+    for _, subida, _ in archivos:
+        if subida is not None:
+            subida.eliminar()
+
+async def _stream_lote(archivos):
+    """
+    Una línea por archivo del lote a medida que termina su extracción (no en orden de
+    subida: "index" es su posición) y una línea final con el resumen. Los archivos se
+    reparten por el pool con una ventana acotada de extracciones en curso; los errores
+    de un archivo se informan en su línea sin detener el resto
+    """
+    ventana = asyncio.Semaphore(max(1, config.POOL_WORKERS * 2))
+
+    async def procesar(indice, nombre, subida, error):
+        if error is None:
+            async with ventana:
+                try:
+                    return indice, nombre, await _extraer_con_cache(nombre, subida), None
+                except Exception as e:
+                    logger.error("❌ Error procesando %s: %s", nombre, e)
+                    error = str(e)
+                finally:
+                    subida.eliminar()
+        return indice, nombre, None, error
+
+    tareas = [
+        asyncio.ensure_future(procesar(indice, nombre, subida, error))
+        for indice, (nombre, subida, error) in enumerate(archivos)
+    ]
+    exitosos = 0
+    try:
+        for siguiente in asyncio.as_completed(tareas):
+            indice, nombre, resultado, error = await siguiente
+            if error is not None:
+                yield _linea_ndjson({
+                    "type": "error",
+                    "index": indice,
+                    "success": False,
+                    "filename": nombre,
+                    "error": error,
+                    "message": "Error al procesar el archivo PDF"
+                })
+                continue
+            exitosos += 1
+            yield _linea_ndjson({
+                "type": "file",
+                "index": indice,
+                "success": True,
+                "filename": nombre,
+                "extraction_method": resultado["extraction_method"],
+                "statistics": resultado["statistics"],
+                "data": resultado["data"]
+            })
+
+        yield _linea_ndjson({
+            "type": "summary",
+            "total_archivos": len(archivos),
+            "exitosos": exitosos,
+            "fallidos": len(archivos) - exitosos
+        })
+    finally:
+        # Cliente desconectado: no dejar extracciones pendientes ni temporales
+        for tarea in tareas:
+            tarea.cancel()
+        _eliminar_subidas(archivos)
+
+@app.post("/extract-batch")
+async def extract_batch(files: List[UploadFile] = File(...)):
+    """
+    Extrae varios PDFs en una sola petición: archivos PDF sueltos y/o ZIPs con PDFs.
+    Responde NDJSON con una línea por archivo según terminan (resultado o error) y una
+    línea final con el resumen; cada PDF se procesa como en /extract-table (y comparte su cache)
+    """
+    archivos = []
+    try:
+        for file in files:
+            nombre = file.filename or "unknown"
+            if nombre.lower().endswith(".zip"):
+                restantes = config.BATCH_MAX_FILES - len(archivos)
+                bytes_restantes = config.BATCH_MAX_BYTES - _bytes_lote(archivos) if config.BATCH_MAX_BYTES else None
+                archivos.extend(await run_in_threadpool(
+                    guardar_zip, file.file, nombre, restantes, None, bytes_restantes
+                ))
+            elif nombre.lower().endswith(".pdf"):
+                try:
+                    # 📥 Cada PDF se vuelca a su temporal por bloques, como en /extract-table
+                    archivos.append((nombre, await run_in_threadpool(guardar_subida, file.file), None))
+                except ArchivoDemasiadoGrande as e:
+                    archivos.append((nombre, None, str(e)))
+            else:
+                archivos.append((nombre, None, "Solo se permiten archivos PDF o ZIP"))
+
+            if len(archivos) > config.BATCH_MAX_FILES:
+                raise LoteDemasiadoGrande(f"El lote supera el máximo de {config.BATCH_MAX_FILES} archivos")
+            if config.BATCH_MAX_BYTES and _bytes_lote(archivos) > config.BATCH_MAX_BYTES:
+                raise LoteDemasiadoGrande(f"El lote supera el tamaño máximo de {config.BATCH_MAX_BYTES} bytes")
+
+        logger.info("🚀 Lote de %s archivos", len(archivos))
+        return StreamingResponse(
+            _stream_lote(archivos),
+            media_type="application/x-ndjson",
+            background=BackgroundTask(_eliminar_subidas, archivos)
+        )
+
+    except LoteDemasiadoGrande as e:
+        _eliminar_subidas(archivos)
+        logger.warning("⚠️ Lote demasiado grande: %s", e)
+        return _respuesta_lote_demasiado_grande(str(e))
+    except Exception as e:
+        _eliminar_subidas(archivos)
+        logger.error("❌ Error preparando el lote: %s", e)
+        return JSONResponse(
+            status_code=500,
+            content={
+                "success": False,
+                "error": str(e),
+                "message": "Error al procesar el lote"
+            }
+        )
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Contadores de aciertos/fallos de la cache de resultados"""
+    return cache_resultados.stats()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,530 @@
+import logging
+import re
+from contextlib import closing
+from itertools import islice
+import numpy as np
+from documento import abrir_documento, spans_de_pagina
+from layouts import RecorteTabla, analizar_pagina, layout_documento, resolver_layout
+from perfiles import PERFIL_DEFECTO, obtener_perfil
+from registros import COLUMNAS, Registro, registros_a_dicts
+from spans import (
+    AsignacionFila, CLASE_EXCLUIDO, ClasificadorTokens, IndiceHeaders, TablaSpans, cubetas_con, cubetas_por_y,
+    TOKEN_DESC_TIPO_ADQ, TOKEN_DESCRIPCION_VALIDA, TOKEN_INVENTARIO, TOKEN_PROG, TOKEN_SERIE_NUM,
+    TOKEN_TIPO_ADQ_AMPLIO,
+)
+
+logger = logging.getLogger(__name__)
+
+columnas_clave = COLUMNAS
+
+EXCLUDE = {"Declaro","protesta","NOMBRE","FIRMA","TOTAL","CEDULA","CVE.","CODI","000","0000","00","SELLO","NOMBRE Y FIRMA DEL TITULAR"}
+
+column_patterns = {
+    "NO. INVENTARIO": re.compile(r'^\d{5,}-\d{4}-\d{4,6}-\d{1,2}$'),
+    "COSTO":          re.compile(r'^[\d\.,]+\s*$'),
+    "PROG":           re.compile(r'^\d{1,3}\s*$'),
+    "TIPO_ADQ":       re.compile(r'^([A-Z]\d{1,2}-\d{1,2}|\d{1,3})$'),
+    "TIPO_ADQ_AMPLIO": re.compile(r'^([A-Z]\d{1,2}-\d{1,2}|\d+)$'),
+    "SERIE_NUM":      re.compile(r'^\d{4,}$'),
+    "MODELO_SLASH":   re.compile(r'.*/.*'),
+    "DESC_TIPO_ADQ":  re.compile(r'C\.A\.P\.C\.E\.Q|I\.L\.C\.E|CONAFE|Muebles|Instrumental|Equipos|P\.A\.R\.E\.I\.B|P\.E\.C\.|U\.S\.E\.B\.E\.Q'),
+    "DESCRIPCION_VALIDA": re.compile(r'^.*[A-Za-z].*$'), 
+}
+
+class AreaMappedExtractor:
+    """
+    Extractor CORREGIDO que mapea áreas específicas del PDF. Todo lo que depende del
+    formato (áreas, ventanas X de las reglas y correcciones) viene del perfil de layout
+    """
+    
+    def __init__(self, perfil=None):
+        self.perfil = perfil or obtener_perfil(PERFIL_DEFECTO)
+        self.column_areas = {}
+        self.ultimo_prog = 0
+        self.progs_usados = set()
+        self.header_y_positions = set()
+        self._indice_headers = None
+        # Traza detallada por span/fila solo si el log está en DEBUG (se evalúa una vez por página)
+        self.trace = logger.isEnabledFor(logging.DEBUG)
+        self.known_brands = {
+            "OLYMPIA", "NOKIA", "CISCO", "SAMSUNG", "HP", "DELL", "CANON", 
+            "EPSON", "BROTHER", "LEXMARK", "XEROX", "PANASONIC", "SONY"
+        }
+        # Cada texto se clasifica contra todos los patrones una sola vez por página
+        self.clasificador = ClasificadorTokens(column_patterns, self.known_brands)
+        
+    def detect_and_exclude_headers(self, spans):
+        """Detecta headers con cobertura REDUCIDA"""
+        if self.trace:
+            logger.debug("🚫 Detectando headers...")
+        
+        # Acepta los spans ya extraídos de la página (o la página, por compatibilidad)
+        if hasattr(spans, "get_text"):
+            spans = spans_de_pagina(spans)
+        
+        for texto, _, y_pos, _, _ in spans:
+            text = texto.strip().upper()
+            
+            
+            if text in ["PROG", "DESCRIPCION", "OBSERVACIONES", "MARCA", "MODELO", 
+                      "SERIE", "COSTO", "TIPO ADQ", "DESC. TIPO ADQ", "NO. INVENTARIO",
+                      "COSTO DEL BIEN", "PROG DESCRIPCION"]:
+                self.header_y_positions.add(round(y_pos, 1))
+                if self.trace:
+                    logger.debug("🚫 Header: '%s' Y=%s", text, y_pos)
+            
+          
+            elif any(titulo in text for titulo in [
+                "UNIDAD DE SERVICIOS", "DIRECCION DE ADMINISTRACION", 
+                "DEPARTAMENTO", "SUBJEFATURA", "CEDULA", "BIENES DE TIPO",
+                "PATRIMONIO", "AREA O PLANTEL"
+            ]):
+                self.header_y_positions.add(round(y_pos, 1))
+                if self.trace:
+                    logger.debug("🚫 Título: '%s...' Y=%s", text[:20], y_pos)
+            
+           
+            elif y_pos < 120:  
+                self.header_y_positions.add(round(y_pos, 1))
+                if self.trace:
+                    logger.debug("🚫 Header superior: '%s...' Y=%s", text[:15], y_pos)
+
+    def indice_headers(self):
+        """Índice ordenado de header_y_positions (se reconstruye solo si el conjunto creció)"""
+        if self._indice_headers is None or len(self._indice_headers) != len(self.header_y_positions):
+            self._indice_headers = IndiceHeaders(self.header_y_positions)
+        return self._indice_headers
+    
+    def is_header_position(self, y_pos, tolerance=4):
+        """Verifica si es header con tolerancia MUY REDUCIDA (búsqueda binaria)"""
+        return self.indice_headers().contiene(y_pos, tolerance)
+    
+    def header_mask(self, y, tolerance=4):
+        """is_header_position vectorizado sobre el array de Y de la página"""
+        return self.indice_headers().mascara(y, tolerance)
+    
+    def setup_default_areas(self):
+        """Configura áreas CORREGIDAS (las del perfil, ya compiladas y compartidas)"""
+        if self.trace:
+            logger.debug("🔧 Configurando áreas corregidas (perfil %s)...", self.perfil.nombre)
+        
+        self.column_areas = self.perfil.column_areas
+        if self.trace:
+            for col_name, area in self.column_areas.items():
+                logger.debug("📏 %s: X=%s-%s (±%s)", col_name, area['x_min'], area['x_max'], area['tolerance'])
+        
+        # Índice de intervalos compilado una vez por perfil y compartido entre páginas
+        self.indice_columnas = self.perfil.indice_columnas
+    
+    def group_multiline_elements(self, tabla, indices):
+        """
+        AGRUPA elementos multilínea CORREGIDO (filas como listas de índices de la tabla).
+        Un solo barrido sobre las cubetas ordenadas por Y: cada cubeta calcula una vez si
+        tiene PROG en el margen izquierdo (perfil.margen_prog) o número de inventario, y se fusiona con la
+        anterior cuando está a menos de 18pt, no tiene ninguno de los dos y la anterior
+        tiene PROG
+        """
+        if self.trace:
+            logger.debug("🔗 Agrupando elementos multilínea...")
+        
+        if len(indices) == 0:
+            return {}
+        
+        # Cubetas de 6pt en Y calculadas sobre el array completo
+        claves = (np.rint(tabla.y0[indices] / 6) * 6).astype(np.int64)
+        y_positions, inicios, ordenados = cubetas_por_y(claves, indices)
+        
+        # Rasgos por cubeta (se calculan una sola vez, no por cada comparación)
+        tokens = tabla.tokens[ordenados]
+        tiene_prog = cubetas_con(((tokens & TOKEN_PROG) != 0) &
+                                 (tabla.x0[ordenados] < self.perfil.margen_prog), inicios)
+        tiene_inventario = cubetas_con((tokens & TOKEN_INVENTARIO) != 0, inicios)
+        
+        fusionar = np.zeros(len(y_positions), dtype=bool)
+        fusionar[1:] = ((np.diff(y_positions) < 18) &
+                        ~tiene_prog[1:] &
+                        ~tiene_inventario[1:] &
+                        tiene_prog[:-1])
+        
+        # Una cubeta que se fusiona nunca tiene PROG, así que la anterior siempre es
+        # una fila propia (no hay cadenas de fusiones)
+        filas_fusionadas = {}
+        y_anterior = None
+        for y_pos, grupo, debe_fusionar in zip(y_positions.tolist(),
+                                               np.split(ordenados, inicios[1:]),
+                                               fusionar.tolist()):
+            if debe_fusionar:
+                filas_fusionadas[y_anterior].extend(grupo.tolist())
+                if self.trace:
+                    logger.debug("🔗 Fusionando Y=%s con Y=%s (multilínea)", y_pos, y_anterior)
+            else:
+                filas_fusionadas[y_pos] = grupo.tolist()
+            y_anterior = y_pos
+        
+        return filas_fusionadas
+    
+    def extract_by_area_mapping_corrected(self, tabla, page_num):
+        """Extrae datos CORRIGIENDO asignaciones erróneas"""
+        if self.trace:
+            logger.debug("🎯 EXTRACCIÓN CORREGIDA - Página %s", page_num)
+        
+        # Acepta la TablaSpans de la página (o la lista de dicts anterior)
+        if not isinstance(tabla, TablaSpans):
+            tabla = TablaSpans.desde_elementos(tabla)
+        tabla.clasificar(EXCLUDE)
+        self.tabla = tabla
+        self.x0s = tabla.x0.tolist()
+        self.tokens = self.clasificador.clasificar(tabla)
+        
+        # Filtro de headers y textos excluidos como una sola máscara sobre la página
+        validos = (tabla.clases & CLASE_EXCLUIDO) == 0
+        validos &= ~self.header_mask(tabla.y0, tolerance=3)
+        elementos_filtrados = np.flatnonzero(validos)
+        
+        if self.trace:
+            logger.debug("📊 Elementos válidos: %s", len(elementos_filtrados))
+        
+     
+        filas = self.group_multiline_elements(tabla, elementos_filtrados)
+        textos = tabla.textos
+        x0s = self.x0s
+        tokens = self.tokens
+        reglas = self.perfil.reglas
+        
+        # Columna por posición de todos los spans de la página en una sola búsqueda
+        columnas_por_posicion = self.indice_columnas.buscar_todos(tabla.x0)
+        
+        registros_extraidos = []
+        
+    
+        for y_pos, elementos_fila in sorted(filas.items()):
+            if len(elementos_fila) < 1:
+                continue
+                
+            registro = Registro()
+            asignacion = AsignacionFila()
+            elementos_asignados = 0
+            
+            if self.trace:
+                logger.debug("📋 Fila Y=%s (%s elementos)", y_pos, len(elementos_fila))
+            
+          
+            for i in elementos_fila:
+                texto = textos[i]
+                x_pos = x0s[i]
+                bits = tokens[i]
+                columna_asignada = None
+                
+              
+                # Reglas del perfil en orden: la primera cuyo token y ventana X coinciden
+                for columna, token, bit, x_min, x_max, x_min_exclusivo in reglas:
+                    if (bits & bit and x_pos <= x_max and
+                            (x_pos > x_min if x_min_exclusivo else x_pos >= x_min)):
+                        columna_asignada = columna
+                        break
+                
+                if columna_asignada == "PROG":
+                    prog_num = int(texto)
+                    if prog_num in self.progs_usados:
+                        if self.trace:
+                            logger.debug("❌ PROG DUPLICADO: '%s' ya usado", texto)
+                        continue
+                    self.progs_usados.add(prog_num)
+                
+                if columna_asignada and self.trace:
+                    logger.debug("🎯 %s: '%s' → %s (X=%s)", token, texto, columna_asignada, x_pos)
+                
+         
+                if columna_asignada and not registro[columna_asignada]:
+                    registro[columna_asignada] = texto
+                    asignacion.agregar(columna_asignada, i)
+                    elementos_asignados += 1
+            
+      
+            for i in elementos_fila:
+                texto = textos[i]
+                x_pos = x0s[i]
+                
+           
+                if asignacion.asignado(i):
+                    continue
+                
+                columna_asignada = columnas_por_posicion[i]
+                
+                if columna_asignada:
+             
+                    if columna_asignada in ["OBSERVACIONES", "DESC. TIPO ADQ."]: 
+                        if registro[columna_asignada]:
+                            registro[columna_asignada] += " " + texto
+                        else:
+                            registro[columna_asignada] = texto
+                        asignacion.agregar(columna_asignada, i)
+                    elif columna_asignada == "DESCRIPCION":
+                      
+                        if not registro[columna_asignada] or len(texto) < len(registro[columna_asignada]):
+                            registro[columna_asignada] = texto
+                            asignacion.reemplazar(columna_asignada, i)
+                    else:
+                    
+                        if not registro[columna_asignada]:
+                            registro[columna_asignada] = texto
+                            asignacion.agregar(columna_asignada, i)
+                    
+                    elementos_asignados += 1
+                    if self.trace:
+                        logger.debug("🎯 ÁREA: '%s' → %s (X=%s)", texto, columna_asignada, x_pos)
+                else:
+                    if self.trace:
+                        logger.debug("❌ FUERA DE ÁREA: '%s' (X=%s)", texto, x_pos)
+            
+          
+            registro_corregido = self.validate_and_fix_record_corrected(registro, elementos_fila, asignacion)
+            
+           
+            if self.is_valid_record_corrected(registro_corregido):
+                registros_extraidos.append(registro_corregido)
+                if self.trace:
+                    logger.debug("✅ REGISTRO VÁLIDO: PROG=%s", registro_corregido.prog)
+            else:
+                if self.trace:
+                    logger.debug("❌ REGISTRO INVÁLIDO")
+        
+        return registros_extraidos
+    
+    def find_column_by_position_corrected(self, x_pos, texto):
+        """Encuentra columna por posición CORREGIDA (búsqueda binaria en el índice de intervalos)"""
+        return self.indice_columnas.buscar(x_pos)
+    
+    def validate_and_fix_record_corrected(self, registro, elementos_fila, asignacion):
+        """
+        Valida y CORREGE registro con lógica ESPECÍFICA. asignacion (AsignacionFila)
+        sigue qué spans contiene cada columna y se actualiza con cada corrección
+        """
+        textos = self.tabla.textos
+        x0s = self.x0s
+        tokens = self.tokens
+        bits = self.clasificador.bits
+        ventanas = self.perfil.correcciones
+        
+ 
+        prog_actual = registro.prog.strip()
+        if prog_actual and prog_actual.isdigit():
+            prog_num = int(prog_actual)
+            self.ultimo_prog = max(self.ultimo_prog, prog_num)
+        else:
+        
+            if (registro.descripcion or 
+                registro.no_inventario or 
+                registro.costo):
+                siguiente_prog = self.ultimo_prog + 1
+                while siguiente_prog in self.progs_usados:
+                    siguiente_prog += 1
+                
+                registro.prog = str(siguiente_prog)
+                self.progs_usados.add(siguiente_prog)
+                self.ultimo_prog = siguiente_prog
+                if self.trace:
+                    logger.debug("🔢 PROG asignado: %s", siguiente_prog)
+        
+  
+        descripcion = registro.descripcion.strip()
+        if descripcion and not bits(descripcion) & TOKEN_DESCRIPCION_VALIDA:
+            if self.trace:
+                logger.debug("❌ DESCRIPCION INVÁLIDA: '%s' (solo números)", descripcion)
+      
+            x_min, x_max = ventanas["descripcion_invalida"]
+            for i in elementos_fila:
+                texto = textos[i]
+                x_pos = x0s[i]
+                
+                if (not asignacion.asignado(i) and
+                    tokens[i] & TOKEN_DESCRIPCION_VALIDA and
+                    x_min <= x_pos <= x_max and
+                    len(texto) > 3):
+                    registro.descripcion = texto
+                    asignacion.reemplazar("DESCRIPCION", i)
+                    if self.trace:
+                        logger.debug("🔄 DESCRIPCION CORREGIDA: '%s'", texto)
+                    break
+        
+ 
+        observaciones = registro.observaciones.strip()
+        if observaciones and "/" in observaciones and len(observaciones) < 25:
+            if not registro.modelo:
+                registro.modelo = observaciones
+                registro.observaciones = ""
+                asignacion.mover("OBSERVACIONES", "MODELO")
+                if self.trace:
+                    logger.debug("🔄 MODELO corregido: '%s' (de OBSERVACIONES)", observaciones)
+        
+
+        marca = registro.marca.strip()
+        if marca and bits(marca) & TOKEN_SERIE_NUM:
+            if not registro.serie:
+                registro.serie = marca
+                registro.marca = ""
+                asignacion.mover("MARCA", "SERIE")
+                if self.trace:
+                    logger.debug("🔄 SERIE corregida: '%s' (de MARCA)", marca)
+
+        desc_tipo = registro.desc_tipo_adq.strip()
+        if desc_tipo and bits(desc_tipo) & TOKEN_INVENTARIO:
+            registro.no_inventario = desc_tipo
+            registro.desc_tipo_adq = ""
+            asignacion.mover("DESC. TIPO ADQ.", "NO. INVENTARIO")
+  
+            x_min, x_max = ventanas["desc_tipo_adq"]
+            for i in elementos_fila:
+                txt = textos[i]
+                x0 = x0s[i]
+                if tokens[i] & TOKEN_DESC_TIPO_ADQ and x_min <= x0 <= x_max:
+                    registro.desc_tipo_adq = txt
+                    asignacion.agregar("DESC. TIPO ADQ.", i)
+                    break
+
+  
+        if not registro.tipo_adq.strip():
+            x_min, x_max = ventanas["tipo_adq"]
+            for i in elementos_fila:
+                txt = textos[i]
+                x0 = x0s[i]
+                if x_min <= x0 <= x_max and tokens[i] & TOKEN_TIPO_ADQ_AMPLIO:
+                    registro.tipo_adq = txt
+                    asignacion.agregar("TIPO ADQ.", i)
+                    break
+
+        desc = registro.descripcion.strip()
+        if desc and ("SERIE:" in desc or "MCA." in desc):
+            registro.observaciones = desc
+            registro.descripcion = ""
+            asignacion.mover("DESCRIPCION", "OBSERVACIONES")
+
+            x_min, x_max = ventanas["descripcion_movida"]
+            for i in elementos_fila:
+                txt = textos[i]
+                x0 = x0s[i]
+                if tokens[i] & TOKEN_DESCRIPCION_VALIDA and x_min <= x0 <= x_max:
+                    registro.descripcion = txt
+                    asignacion.agregar("DESCRIPCION", i)
+                    break
+
+        return registro
+    
+    def is_valid_record_corrected(self, registro):
+        """Verifica registro con validación CORREGIDA"""
+
+        prog = registro.prog.strip()
+        if not prog or not prog.isdigit():
+            return False
+        
+     
+        descripcion = registro.descripcion.strip()
+        if not descripcion or not self.clasificador.bits(descripcion) & TOKEN_DESCRIPCION_VALIDA:
+            return False
+        
+
+        campos_importantes = [registro.no_inventario, registro.costo, registro.tipo_adq]
+        campos_importantes_llenos = sum(1 for campo in campos_importantes if campo.strip())
+        
+        return campos_importantes_llenos >= 1
+
+
+def asignar_registros(tabla, page_num, spans_pagina=None, perfil=None):
+    """Asignación por mapeo de áreas de una página: lista de registros.Registro"""
+    extractor = AreaMappedExtractor(perfil)
+    
+    if spans_pagina:
+        extractor.detect_and_exclude_headers(spans_pagina)
+    
+    extractor.setup_default_areas()
+    
+    return extractor.extract_by_area_mapping_corrected(tabla, page_num)
+
+def assign_by_area_mapping(tabla, page_num, spans_pagina=None, perfil=None):
+    """Función principal CORREGIDA de asignación por mapeo de áreas (registros como dicts)"""
+    return registros_a_dicts(asignar_registros(tabla, page_num, spans_pagina, perfil))
+
+def iter_paginas_registros(pdf, pages=None, perfil=None, inicial=None):
+    """
+    Genera (pagina, registros) a medida que se procesa cada página, con los registros
+    como registros.Registro (pipeline: viajan así por el pool). perfil=None elige
+    el perfil de cada plantilla por sus encabezados (p.ej. la columna CODI).
+    inicial: layout de las páginas sin fila de encabezados hasta la primera que la
+    tenga; con perfil=None y sin inicial se usa el del documento (layout_documento),
+    así un tramo de páginas da lo mismo que dentro de la extracción completa
+    """
+    doc, propio = abrir_documento(pdf)
+
+    try:
+        # pages: números de página (base 1) a procesar; None = todo el documento
+        if pages is None:
+            pages = range(1, len(doc)+1)
+
+        layout = inicial
+        if layout is None and perfil is None:
+            layout = layout_documento(doc)
+        recorte = RecorteTabla()
+        for page_num in pages:
+            logger.debug("📄 ===== PÁGINA %s =====", page_num)
+        
+            # Una sola extracción por página, compartida con la detección de CODI y de headers;
+            # tras la primera página de una plantilla, solo la región de su tabla
+            spans = None
+            fuera_de_region = False
+            if recorte.franja is not None:
+                spans = doc.spans(page_num-1, recorte.franja)
+                analisis = analizar_pagina(spans)
+                if not recorte.valida(spans, analisis):
+                    logger.debug("✂️ Página %s fuera de la región de la plantilla: extracción completa", page_num)
+                    spans = None
+                    fuera_de_region = True
+            if spans is None:
+                spans = doc.spans(page_num-1)
+                analisis = analizar_pagina(spans)
+                # Si la franja no servía, la región se vuelve a calcular con esta página
+                recorte.actualizar(spans, analisis, forzar=fuera_de_region)
+
+            tabla = TablaSpans.desde_spans(spans)
+            logger.debug("📊 Elementos extraídos: %s", len(tabla))
+
+            # Perfil y bandas calibradas de la plantilla de la página (cacheados por huella de encabezados)
+            layout = resolver_layout(perfil, analisis, layout)
+
+            page_results = asignar_registros(tabla, page_num, spans, layout)
+            logger.debug("🎯 Registros válidos: %s", len(page_results))
+
+            doc.descartar(page_num-1)
+
+            yield page_num, page_results
+    finally:
+        if propio:
+            doc.close()
+
+def iter_paginas(pdf, pages=None, perfil=None, inicial=None):
+    """Como iter_paginas_registros, con los registros de cada página como dicts"""
+    with closing(iter_paginas_registros(pdf, pages, perfil, inicial)) as paginas:
+        for page_num, page_results in paginas:
+            yield page_num, registros_a_dicts(page_results)
+
+def iter_registros(pdf, pages=None, perfil=None, inicial=None):
+    """Genera los registros (dicts) de forma perezosa, página a página, sin acumular el documento completo"""
+    for _, page_results in iter_paginas(pdf, pages, perfil, inicial):
+        yield from page_results
+
+def extraer_registros(pdf, pages=None, perfil=None, max_registros=None, inicial=None):
+    """
+    Extracción completa como lista de registros.Registro (opcionalmente limitada a un
+    rango de páginas). max_registros: se deja de procesar páginas en cuanto se
+    alcanza ese número de registros
+    """
+    with closing(iter_paginas_registros(pdf, pages, perfil, inicial)) as paginas:
+        registros = (registro for _, page_results in paginas for registro in page_results)
+        resultados_totales = list(islice(registros, max_registros))
+    
+    logger.info("🏁 EXTRACCIÓN COMPLETADA: %s registros", len(resultados_totales))
+    
+    return resultados_totales
+
+def extraer_datos_por_celdas(pdf, pages=None, perfil=None, max_registros=None, inicial=None):
+    """Función principal CORREGIDA: extraer_registros con los registros como dicts"""
+    return registros_a_dicts(extraer_registros(pdf, pages, perfil, max_registros, inicial))
@@ -0,0 +1,216 @@
+import math
+
+from columnas import IndiceColumnas
+from spans import (
+    TOKEN_COSTO, TOKEN_DESC_TIPO_ADQ, TOKEN_INVENTARIO, TOKEN_MARCA, TOKEN_MODELO,
+    TOKEN_PROG, TOKEN_SERIE_NUM, TOKEN_TIPO_ADQ,
+)
+
+# 📐 Perfiles de layout: todo lo que cambia de un formato de cédula a otro
+#   columnas:     áreas por columna (X de inicio/fin y tolerancia) para la asignación por posición
+#   reglas:       primera pasada, en orden: un span con el token y dentro de la ventana X
+#                 va a la columna (x_min_exclusivo: la ventana empieza estrictamente después de x_min)
+#   correcciones: ventanas X de validate_and_fix_record_corrected (y la columna a la que pertenecen)
+#   margen_prog:  X máxima de un PROG para considerar que una cubeta abre fila (multilínea)
+#   encabezados:  X de los encabezados de columna de la plantilla con la que se ajustaron las
+#                 X anteriores; si se detectan en otra posición, las bandas se desplazan (calibración)
+#   etiquetas:    encabezados que, presentes en la página, seleccionan este perfil
+#   base:         perfil del que se heredan las claves no declaradas
+# Un layout nuevo es una entrada más en PERFILES, no otra copia del extractor
+
+PERFIL_DEFECTO = "estandar"
+PERFIL_CODI = "codi"
+
+# Encabezados (normalizados) que marcan la posición de cada columna, en orden de preferencia
+ETIQUETAS_COLUMNA = {
+    "PROG":            ["PROG", "PROG DESCRIPCION"],
+    "DESCRIPCION":     ["DESCRIPCION", "PROG DESCRIPCION"],
+    "OBSERVACIONES":   ["OBSERVACIONES"],
+    "MARCA":           ["MARCA"],
+    "MODELO":          ["MODELO"],
+    "SERIE":           ["SERIE"],
+    "COSTO":           ["COSTO", "COSTO DEL BIEN"],
+    "TIPO ADQ.":       ["TIPO ADQ"],
+    "DESC. TIPO ADQ.": ["DESC. TIPO ADQ"],
+    "NO. INVENTARIO":  ["NO. INVENTARIO"],
+}
+
+TOKENS = {
+    "INVENTARIO": TOKEN_INVENTARIO,
+    "PROG": TOKEN_PROG,
+    "TIPO_ADQ": TOKEN_TIPO_ADQ,
+    "COSTO": TOKEN_COSTO,
+    "DESC_TIPO_ADQ": TOKEN_DESC_TIPO_ADQ,
+    "SERIE_NUM": TOKEN_SERIE_NUM,
+    "MODELO": TOKEN_MODELO,
+    "MARCA": TOKEN_MARCA,
+}
+
+PERFILES = {
+    # Formato estándar (sin columna CODI)
+    "estandar": {
+        "columnas": {
+            "PROG":            {"x_min_offset": 18,  "x_max_offset": 20,  "tolerance": 5},
+            "DESCRIPCION":     {"x_min_offset": 20,  "x_max_offset": 120, "tolerance": 20},
+            "OBSERVACIONES":   {"x_min_offset": 180, "x_max_offset": 220, "tolerance": 20},
+            "MARCA":           {"x_min_offset": 300, "x_max_offset": 380, "tolerance": 10},
+            "MODELO":          {"x_min_offset": 420, "x_max_offset": 450, "tolerance": 10},
+            "SERIE":           {"x_min_offset": 480, "x_max_offset": 550, "tolerance": 10},
+            "COSTO":           {"x_min_offset": 570, "x_max_offset": 660, "tolerance": 10},
+            "TIPO ADQ.":       {"x_min_offset": 630, "x_max_offset": 680, "tolerance": 15},
+            "DESC. TIPO ADQ.": {"x_min_offset": 680, "x_max_offset": 760, "tolerance": 25},
+            "NO. INVENTARIO":  {"x_min_offset": 780, "x_max_offset": 800, "tolerance": 15},
+        },
+        "reglas": [
+            {"columna": "NO. INVENTARIO",  "token": "INVENTARIO",    "x_min": 820, "x_min_exclusivo": True},
+            {"columna": "PROG",            "token": "PROG",          "x_min": 15,  "x_max": 55},
+            {"columna": "TIPO ADQ.",       "token": "TIPO_ADQ",      "x_min": 615, "x_max": 630},
+            {"columna": "COSTO",           "token": "COSTO",         "x_min": 570, "x_max": 625},
+            {"columna": "DESC. TIPO ADQ.", "token": "DESC_TIPO_ADQ", "x_min": 665},
+            {"columna": "SERIE",           "token": "SERIE_NUM",     "x_min": 520, "x_max": 580},
+            {"columna": "MODELO",          "token": "MODELO",        "x_min": 480, "x_max": 530},
+            {"columna": "MARCA",           "token": "MARCA",         "x_min": 440, "x_max": 490},
+        ],
+        "correcciones": {
+            # reemplazo de una DESCRIPCION sin letras
+            "descripcion_invalida": {"columna": "DESCRIPCION",     "x_min": 40,  "x_max": 290},
+            # DESC. TIPO ADQ. tras moverla a NO. INVENTARIO
+            "desc_tipo_adq":        {"columna": "DESC. TIPO ADQ.", "x_min": 665, "x_max": 825},
+            # TIPO ADQ. vacío
+            "tipo_adq":             {"columna": "TIPO ADQ.",       "x_min": 620, "x_max": 665},
+            # DESCRIPCION tras moverla a OBSERVACIONES
+            "descripcion_movida":   {"columna": "DESCRIPCION",     "x_min": 45,  "x_max": 285},
+        },
+        "margen_prog": 55,
+        # Sin plantilla de referencia: las bandas estáticas no se calibran
+        "encabezados": {},
+        "etiquetas": [],
+    },
+    # Formato con columna CODI: las columnas se desplazan a la izquierda
+    "codi": {
+        "base": "estandar",
+        "columnas": {
+            "PROG":            {"x_min_offset": 18,  "x_max_offset": 20,  "tolerance": 5},
+            "DESCRIPCION":     {"x_min_offset": 20,  "x_max_offset": 100, "tolerance": 20},
+            "OBSERVACIONES":   {"x_min_offset": 110, "x_max_offset": 200, "tolerance": 20},
+            "MARCA":           {"x_min_offset": 210, "x_max_offset": 350, "tolerance": 10},
+            "MODELO":          {"x_min_offset": 360, "x_max_offset": 400, "tolerance": 10},
+            "SERIE":           {"x_min_offset": 400, "x_max_offset": 460, "tolerance": 10},
+            "COSTO":           {"x_min_offset": 470, "x_max_offset": 560, "tolerance": 10},
+            "TIPO ADQ.":       {"x_min_offset": 580, "x_max_offset": 600, "tolerance": 15},
+            "DESC. TIPO ADQ.": {"x_min_offset": 630, "x_max_offset": 700, "tolerance": 25},
+            "NO. INVENTARIO":  {"x_min_offset": 780, "x_max_offset": 800, "tolerance": 15},
+        },
+        "encabezados": {
+            "PROG DESCRIPCION": 13.5, "OBSERVACIONES": 189.0, "MARCA": 315.0, "MODELO": 378.0,
+            "SERIE": 459.0, "COSTO DEL BIEN": 534.8, "TIPO ADQ": 603.8, "DESC. TIPO ADQ": 675.0,
+            "NO. INVENTARIO": 778.5, "CODI": 895.5,
+        },
+        "etiquetas": ["CODI"],
+    },
+}
+
+_cargados = {}
+
+
+class PerfilLayout:
+    """
+    Perfil de PERFILES ya compilado: áreas de columna con su índice de intervalos,
+    reglas de la primera pasada como tuplas y ventanas de corrección. Se construye
+    una sola vez por proceso y lo comparten todas las páginas (ver obtener_perfil)
+    """
+
+    def __init__(self, nombre, definicion):
+        self.nombre = nombre
+        self.definicion = definicion
+        self.column_config = definicion["columnas"]
+        self.column_areas = {
+            col_name: {
+                "x_min": config["x_min_offset"],
+                "x_max": config["x_max_offset"],
+                "tolerance": config["tolerance"]
+            }
+            for col_name, config in self.column_config.items()
+        }
+        self.indice_columnas = IndiceColumnas.para(self.column_areas)
+
+        # (columna, nombre del token, bit, x_min, x_max, x_min_exclusivo)
+        self.reglas = [
+            (regla["columna"], regla["token"], TOKENS[regla["token"]],
+             regla.get("x_min", -math.inf), regla.get("x_max", math.inf),
+             regla.get("x_min_exclusivo", False))
+            for regla in definicion["reglas"]
+        ]
+        self.correcciones = {
+            clave: (ventana["x_min"], ventana["x_max"])
+            for clave, ventana in definicion["correcciones"].items()
+        }
+        self.margen_prog = definicion["margen_prog"]
+        self.encabezados = definicion["encabezados"]
+        self.desplazamientos = {}
+
+    def __repr__(self):
+        return f"PerfilLayout({self.nombre!r})"
+
+    def desplazado(self, desplazamientos):
+        """
+        Copia del perfil con las X de cada columna desplazadas ({columna: dx}): bandas,
+        ventanas de las reglas y de las correcciones y el margen de PROG
+        """
+        definicion = dict(self.definicion)
+        definicion["columnas"] = {
+            col_name: {
+                **config,
+                "x_min_offset": config["x_min_offset"] + desplazamientos.get(col_name, 0),
+                "x_max_offset": config["x_max_offset"] + desplazamientos.get(col_name, 0),
+            }
+            for col_name, config in self.column_config.items()
+        }
+        definicion["reglas"] = [_desplazar_ventana(regla, desplazamientos) for regla in self.definicion["reglas"]]
+        definicion["correcciones"] = {
+            clave: _desplazar_ventana(ventana, desplazamientos)
+            for clave, ventana in self.definicion["correcciones"].items()
+        }
+        definicion["margen_prog"] = self.margen_prog + desplazamientos.get("PROG", 0)
+
+        perfil = PerfilLayout(self.nombre, definicion)
+        perfil.desplazamientos = desplazamientos
+        return perfil
+
+
+def _desplazar_ventana(ventana, desplazamientos):
+    dx = desplazamientos.get(ventana["columna"], 0)
+    ventana = dict(ventana)
+    for limite in ("x_min", "x_max"):
+        if limite in ventana:
+            ventana[limite] += dx
+    return ventana
+
+
+def definicion_perfil(nombre):
+    """Definición declarativa de un perfil con la herencia (base) ya resuelta"""
+    definicion = dict(PERFILES[nombre])
+    base = definicion.pop("base", None)
+    if base is not None:
+        definicion = {**definicion_perfil(base), **definicion}
+    return definicion
+
+
+def elegir_perfil(etiquetas):
+    """Nombre del perfil cuyas etiquetas están todas en la página (el más específico), o el de defecto"""
+    mejor, requeridas = PERFIL_DEFECTO, 0
+    for nombre in PERFILES:
+        propias = definicion_perfil(nombre)["etiquetas"]
+        if propias and len(propias) > requeridas and all(e in etiquetas for e in propias):
+            mejor, requeridas = nombre, len(propias)
+    return mejor
+
+
+def obtener_perfil(nombre):
+    """PerfilLayout compilado y compartido (se compila una sola vez por proceso)"""
+    perfil = _cargados.get(nombre)
+    if perfil is None:
+        if nombre not in PERFILES:
+            raise KeyError(f"Perfil de layout desconocido: {nombre}")
+        perfil = _cargados[nombre] = PerfilLayout(nombre, definicion_perfil(nombre))
+    return perfil
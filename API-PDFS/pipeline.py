@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import config
+import motor
+import perfiles
+from documento import DocumentoPDF
+from layouts import descriptor_layout, layout_desde_descriptor, layout_documento
+
+logger = logging.getLogger(__name__)
+
+# Cambiar al modificar la lógica de extracción: invalida los resultados cacheados
+EXTRACTOR_VERSION = "2.1.5"
+
+def firma_configuracion() -> str:
+    """
+    Huella corta de la versión, de los perfiles de layout del motor y del backend de
+    texto (parte de la clave de cache)
+    """
+    firma = {
+        "version": EXTRACTOR_VERSION,
+        "perfiles": perfiles.PERFILES,
+        "exclude": sorted(motor.EXCLUDE),
+        "backend_texto": config.TEXT_BACKEND,
+    }
+    return hashlib.sha256(json.dumps(firma, sort_keys=True).encode()).hexdigest()[:16]
+
+def metodo_extraccion(tiene_codi: bool) -> str:
+    if tiene_codi:
+        return "Area Mapping + CODI Filter (extractor_filtro_2.py)"
+    return "Area Mapping Standard (extractor.py)"
+
+class EstadisticasExtraccion:
+    """Acumula las estadísticas en una sola pasada, registro a registro (sirve para streaming)"""
+
+    def __init__(self, tiene_codi: bool):
+        self.tiene_codi = tiene_codi
+        self.total_registros = 0
+        self.registros_con_inventario = 0
+        self.registros_con_prog = 0
+        self.columnas = set()
+
+    def agregar(self, registro):
+        self.total_registros += 1
+        if registro.get("NO. INVENTARIO"):
+            self.registros_con_inventario += 1
+        if registro.get("PROG"):
+            self.registros_con_prog += 1
+        self.columnas.update(registro.keys())
+
+    def resultado(self) -> dict:
+        return {
+            "total_registros": self.total_registros,
+            "registros_con_inventario": self.registros_con_inventario,
+            "registros_con_prog": self.registros_con_prog,
+            "columnas_extraidas": list(self.columnas),
+            "tiene_columna_codi": self.tiene_codi,
+            "archivo_extractor": "extractor_filtro_2.py" if self.tiene_codi else "extractor.py"
+        }
+
+def calcular_estadisticas(resultados, tiene_codi: bool) -> dict:
+    """Estadísticas de extracción que acompañan a la respuesta"""
+    estadisticas = EstadisticasExtraccion(tiene_codi)
+    for registro in resultados:
+        estadisticas.agregar(registro)
+    return estadisticas.resultado()
+
+class PaginasInvalidas(ValueError):
+    """El parámetro de páginas no tiene formato válido o no selecciona ninguna página del documento"""
+
+
+def parsear_paginas(texto):
+    """
+    Rangos de páginas (base 1) de un parámetro como "1-5,8,10-12": lista ordenada de
+    (primera, ultima) inclusive. None o vacío = todo el documento (devuelve None)
+    """
+    if texto is None or not texto.strip():
+        return None
+    rangos = []
+    for parte in texto.split(","):
+        parte = parte.strip()
+        primera, guion, ultima = parte.partition("-")
+        primera, ultima = primera.strip(), ultima.strip()
+        if not primera.isdigit() or (guion and not ultima.isdigit()):
+            raise PaginasInvalidas(f"Rango de páginas inválido: '{parte}' (formato: 1-5,8,10-12)")
+        primera = int(primera)
+        ultima = int(ultima) if guion else primera
+        if primera < 1 or ultima < primera:
+            raise PaginasInvalidas(f"Rango de páginas inválido: '{parte}' (formato: 1-5,8,10-12)")
+        rangos.append((primera, ultima))
+    return sorted(rangos)
+
+def seleccionar_paginas(rangos, total_paginas: int) -> list:
+    """Páginas a procesar, en orden y sin repetir: las de los rangos que existen en el documento (None = todas)"""
+    if rangos is None:
+        return list(range(1, total_paginas + 1))
+    seleccion = sorted({
+        pagina
+        for primera, ultima in rangos
+        for pagina in range(primera, min(ultima, total_paginas) + 1)
+    })
+    if not seleccion:
+        raise PaginasInvalidas(f"Ninguna de las páginas pedidas está en el documento ({total_paginas} páginas)")
+    return seleccion
+
+def procesar_pdf(pdf, min_paginas_paralelo=None, paginas=None, max_registros=None) -> dict:
+    """
+    Pipeline completo (layout + extracción). Se ejecuta en el pool de procesos,
+    por lo que debe ser una función de módulo y devolver solo datos serializables
+    (los registros viajan como registros.Registro y se pasan a dict al responder).
+    pdf: ruta del archivo (lo habitual: al pool solo viaja la ruta) o bytes.
+    paginas: rangos de parsear_paginas (None = todas); max_registros: la extracción
+    se detiene al alcanzar ese número de registros.
+    Si se seleccionan al menos min_paginas_paralelo páginas solo se resuelve el
+    layout y se devuelve data=None para que las páginas se repartan en el pool; el
+    layout del documento viaja en "layout" (descriptor_layout) para que cada tramo
+    empiece con el mismo que la extracción secuencial
+    """
+    # Un solo documento abierto para layout y extracción (los spans de la primera página se comparten)
+    with DocumentoPDF(pdf) as documento:
+        # 🎯 CODI como subproducto del layout de la primera página (el motor elige el perfil
+        # de cada página sobre la marcha con la misma pasada)
+        layout = layout_documento(documento)
+        tiene_codi = layout.nombre == perfiles.PERFIL_CODI
+        total_paginas = len(documento)
+        seleccion = seleccionar_paginas(paginas, total_paginas)
+
+        if min_paginas_paralelo and len(seleccion) >= min_paginas_paralelo:
+            logger.info("⚡ %s páginas → extracción paralela por rangos", len(seleccion))
+            return {
+                "paginas": total_paginas,
+                "seleccion": seleccion,
+                "tiene_codi": tiene_codi,
+                "layout": descriptor_layout(layout),
+                "data": None
+            }
+
+        if tiene_codi:
+            logger.info("📊 Columna CODI detectada → perfil codi")
+        else:
+            logger.info("📊 Sin columna CODI → perfil estandar")
+        resultados = motor.extraer_registros(documento, seleccion, max_registros=max_registros, inicial=layout)
+
+    return {
+        "paginas": total_paginas,
+        "seleccion": seleccion,
+        "tiene_codi": tiene_codi,
+        "extraction_method": metodo_extraccion(tiene_codi),
+        "statistics": calcular_estadisticas(resultados, tiene_codi),
+        "data": resultados
+    }
+
+def extraer_paginas(pdf, paginas, layout=None) -> list:
+    """
+    Extrae las páginas indicadas (base 1, en orden) y devuelve una lista
+    [(pagina, registros), ...]. Cada proceso del pool abre el documento por su
+    cuenta a partir de la misma ruta (o bytes). layout: descriptor del layout del
+    documento (el "layout" de procesar_pdf), para no resolverlo de nuevo en cada tramo
+    """
+    return list(motor.iter_paginas_registros(pdf, pages=paginas, inicial=layout_desde_descriptor(layout)))
+
+def dividir_paginas(paginas, partes: int) -> list:
+    """Divide la lista de páginas en tramos consecutivos de tamaño similar"""
+    paginas = list(paginas)
+    partes = max(1, min(partes, len(paginas)))
+    base, resto = divmod(len(paginas), partes)
+    tramos = []
+    inicio = 0
+    for i in range(partes):
+        fin = inicio + base + (1 if i < resto else 0)
+        tramos.append(paginas[inicio:fin])
+        inicio = fin
+    return tramos
+
+def unir_resultados(partes) -> list:
+    """
+    Une los resultados de extraer_paginas en orden de página. Cada página usa su propio
+    AreaMappedExtractor (PROG asignados y usados se reinician por página), así que
+    la reconciliación de PROG consiste en concatenar los tramos ordenados por su
+    primera página: el resultado es idéntico al de la extracción secuencial
+    """
+    resultados = []
+    for parte in sorted(partes, key=lambda parte: parte[0][0]):
+        for _, registros in parte:
+            resultados.extend(registros)
+    return resultados
@@ -0,0 +1,79 @@
+from collections.abc import Mapping
+
+# Columnas de un registro extraído, en el orden en que se devuelven
+COLUMNAS = [
+    "PROG", "DESCRIPCION", "OBSERVACIONES", "MARCA", "MODELO",
+    "SERIE", "COSTO", "TIPO ADQ.", "DESC. TIPO ADQ.",
+    "NO. INVENTARIO"
+]
+
+# Atributo de Registro para cada columna
+ATRIBUTOS = {
+    "PROG": "prog",
+    "DESCRIPCION": "descripcion",
+    "OBSERVACIONES": "observaciones",
+    "MARCA": "marca",
+    "MODELO": "modelo",
+    "SERIE": "serie",
+    "COSTO": "costo",
+    "TIPO ADQ.": "tipo_adq",
+    "DESC. TIPO ADQ.": "desc_tipo_adq",
+    "NO. INVENTARIO": "no_inventario",
+}
+
+
+class Registro(Mapping):
+    """
+    Registro de una fila de la tabla con un atributo (slot) por columna, sin dict por
+    fila: el motor crea uno por cada cubeta de filas, aunque luego se descarte. Es un
+    Mapping de solo lectura de columna → valor (registro["NO. INVENTARIO"], in, keys,
+    items, dict(registro)); las funciones públicas de motor y de los extractores
+    devuelven dicts y el pipeline pasa a dict (a_dict) solo al responder (main.py)
+    """
+
+    __slots__ = tuple(ATRIBUTOS.values())
+
+    def __init__(self):
+        self.prog = self.descripcion = self.observaciones = self.marca = self.modelo = ""
+        self.serie = self.costo = self.tipo_adq = self.desc_tipo_adq = self.no_inventario = ""
+
+    def __getitem__(self, columna):
+        return getattr(self, ATRIBUTOS[columna])
+
+    def __setitem__(self, columna, valor):
+        setattr(self, ATRIBUTOS[columna], valor)
+
+    def __iter__(self):
+        return iter(COLUMNAS)
+
+    def __len__(self):
+        return len(COLUMNAS)
+
+    def valores(self):
+        return tuple(getattr(self, atributo) for atributo in self.__slots__)
+
+    def a_dict(self):
+        return dict(zip(COLUMNAS, self.valores()))
+
+    # Para el pool de procesos: solo la tupla de valores, no un dict por registro
+    def __getstate__(self):
+        return self.valores()
+
+    def __setstate__(self, valores):
+        for atributo, valor in zip(self.__slots__, valores):
+            setattr(self, atributo, valor)
+
+    def __eq__(self, otro):
+        if isinstance(otro, Registro):
+            return self.valores() == otro.valores()
+        if isinstance(otro, dict):
+            return self.a_dict() == otro
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Registro({self.a_dict()!r})"
+
+
+def registros_a_dicts(registros):
+    """Lista de dicts de columna → valor para la respuesta JSON"""
+    return [registro.a_dict() for registro in registros]
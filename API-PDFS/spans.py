@@ -0,0 +1,211 @@
+import bisect
+
+import numpy as np
+
+PUNTUACION = {".", ",", ":", ";", "-", "_", "|"}
+
+# Códigos de clase de token precalculados por span (bits)
+CLASE_EXCLUIDO = 1      # texto de EXCLUDE o puntuación suelta: nunca forma parte de un registro
+
+# Bits de clasificación de tokens: qué patrones de column_patterns cumple cada texto
+TOKEN_INVENTARIO = 1 << 0
+TOKEN_COSTO = 1 << 1             # sobre el texto sin "," ni "$"
+TOKEN_PROG = 1 << 2
+TOKEN_TIPO_ADQ = 1 << 3
+TOKEN_TIPO_ADQ_AMPLIO = 1 << 4
+TOKEN_SERIE_NUM = 1 << 5
+TOKEN_DESC_TIPO_ADQ = 1 << 6     # re.search, no re.match
+TOKEN_DESCRIPCION_VALIDA = 1 << 7
+TOKEN_MODELO = 1 << 8            # contiene "/" y mide menos de 25 caracteres
+TOKEN_MARCA = 1 << 9             # contiene una marca conocida
+
+
+class TablaSpans:
+    """
+    Spans de una página en formato columnar: coordenadas en arrays float64, textos en
+    una lista y códigos de clase por span. El motor de mapeo por áreas
+    trabaja con índices sobre esta tabla en lugar de un dict por span
+    """
+
+    def __init__(self, textos, x0, y0, x1, y1):
+        self.textos = list(textos)
+        self.x0 = np.asarray(x0, dtype=np.float64)
+        self.y0 = np.asarray(y0, dtype=np.float64)
+        self.x1 = np.asarray(x1, dtype=np.float64)
+        self.y1 = np.asarray(y1, dtype=np.float64)
+        self.clases = np.zeros(len(self.textos), dtype=np.uint8)
+        self.tokens = None
+
+    def __len__(self):
+        return len(self.textos)
+
+    @classmethod
+    def desde_spans(cls, spans):
+        """Desde las tuplas (texto, x0, y0, x1, y1) de DocumentoPDF: descarta vacíos y redondea a 0.1"""
+        textos, x0, y0, x1, y1 = [], [], [], [], []
+        for texto, sx0, sy0, sx1, sy1 in spans:
+            txt = texto.strip()
+            if not txt:
+                continue
+            textos.append(txt)
+            x0.append(round(sx0, 1))
+            y0.append(round(sy0, 1))
+            x1.append(round(sx1, 1))
+            y1.append(round(sy1, 1))
+        return cls(textos, x0, y0, x1, y1)
+
+    @classmethod
+    def desde_elementos(cls, elementos):
+        """Desde la lista de dicts {"texto", "x0", "y0", "x1", "y1"} (formato anterior)"""
+        return cls(
+            [elem["texto"].strip() for elem in elementos],
+            [elem["x0"] for elem in elementos],
+            [elem["y0"] for elem in elementos],
+            [elem["x1"] for elem in elementos],
+            [elem["y1"] for elem in elementos],
+        )
+
+    def clasificar(self, exclude):
+        """Marca con CLASE_EXCLUIDO los spans que el extractor nunca asigna a una columna"""
+        for i, texto in enumerate(self.textos):
+            if not texto or texto.upper() in exclude or texto in PUNTUACION:
+                self.clases[i] |= CLASE_EXCLUIDO
+
+
+class ClasificadorTokens:
+    """
+    Evalúa todos los patrones de column_patterns sobre un texto una sola vez y
+    devuelve un bitmask TOKEN_*. Memoriza por texto, así que los valores ya
+    asignados a un registro (que son textos de spans) no vuelven a pasar por regex
+    """
+
+    def __init__(self, patrones, marcas):
+        self.patrones = patrones
+        self.marcas = marcas
+        self._cache = {}
+
+    def bits(self, texto):
+        bits = self._cache.get(texto)
+        if bits is None:
+            bits = self._cache[texto] = self._calcular(texto)
+        return bits
+
+    def _calcular(self, texto):
+        p = self.patrones
+        bits = 0
+        if p["NO. INVENTARIO"].match(texto):
+            bits |= TOKEN_INVENTARIO
+        if p["COSTO"].match(texto.replace(',', '').replace('$', '')):
+            bits |= TOKEN_COSTO
+        if p["PROG"].match(texto):
+            bits |= TOKEN_PROG
+        if p["TIPO_ADQ"].match(texto):
+            bits |= TOKEN_TIPO_ADQ
+        if p["TIPO_ADQ_AMPLIO"].match(texto):
+            bits |= TOKEN_TIPO_ADQ_AMPLIO
+        if p["SERIE_NUM"].match(texto):
+            bits |= TOKEN_SERIE_NUM
+        if p["DESC_TIPO_ADQ"].search(texto):
+            bits |= TOKEN_DESC_TIPO_ADQ
+        if p["DESCRIPCION_VALIDA"].match(texto):
+            bits |= TOKEN_DESCRIPCION_VALIDA
+        if "/" in texto and len(texto) < 25:
+            bits |= TOKEN_MODELO
+        texto_upper = texto.upper()
+        if any(marca in texto_upper for marca in self.marcas):
+            bits |= TOKEN_MARCA
+        return bits
+
+    def clasificar(self, tabla):
+        """Calcula tabla.tokens (un bitmask por span) y lo devuelve como lista"""
+        tokens = [self.bits(texto) for texto in tabla.textos]
+        tabla.tokens = np.array(tokens, dtype=np.uint16)
+        return tokens
+
+
+class AsignacionFila:
+    """
+    Qué spans de una fila están en qué columnas del registro. "¿Ya está asignado
+    este span?" es una consulta O(1) por identidad de span (no por texto), así que
+    dos spans con el mismo texto pueden ir a columnas distintas. Un span puede estar
+    en más de una columna (las correcciones copian textos), por eso se cuentan usos
+    """
+
+    def __init__(self):
+        self.columnas = {}
+        self.usos = {}
+
+    def asignado(self, indice):
+        return indice in self.usos
+
+    def agregar(self, columna, indice):
+        """El span pasa a formar parte del valor de la columna (p.ej. al concatenar)"""
+        self.columnas.setdefault(columna, []).append(indice)
+        self.usos[indice] = self.usos.get(indice, 0) + 1
+
+    def vaciar(self, columna):
+        for indice in self.columnas.pop(columna, ()):
+            if self.usos[indice] == 1:
+                del self.usos[indice]
+            else:
+                self.usos[indice] -= 1
+
+    def reemplazar(self, columna, indice):
+        """El span sustituye al valor anterior de la columna, cuyos spans quedan libres"""
+        self.vaciar(columna)
+        self.agregar(columna, indice)
+
+    def mover(self, origen, destino):
+        """El valor de una columna pasa a otra (los spans siguen asignados)"""
+        self.vaciar(destino)
+        indices = self.columnas.pop(origen, None)
+        if indices:
+            self.columnas[destino] = indices
+
+
+def cubetas_por_y(claves, indices):
+    """
+    Ordena indices por clave de fila (vectorizado, estable: conserva el orden original
+    dentro de cada fila). Devuelve (claves únicas, inicio de cada cubeta, indices ordenados)
+    """
+    orden = np.argsort(claves, kind="stable")
+    claves_ordenadas = claves[orden]
+    y_positions, inicios = np.unique(claves_ordenadas, return_index=True)
+    return y_positions, inicios, indices[orden]
+
+
+def cubetas_con(mascara, inicios):
+    """Por cubeta: True si algún span de la cubeta cumple la máscara (en orden de cubetas_por_y)"""
+    if len(mascara) == 0:
+        return np.zeros(0, dtype=bool)
+    return np.logical_or.reduceat(mascara, inicios)
+
+
+class IndiceHeaders:
+    """
+    Posiciones Y de headers ordenadas para consultar "¿hay un header a ±tolerancia?"
+    con búsqueda binaria: basta comparar con el vecino inmediato a cada lado
+    """
+
+    def __init__(self, header_y_positions):
+        self.posiciones = sorted(header_y_positions)
+        self._posiciones = np.array(self.posiciones, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.posiciones)
+
+    def contiene(self, y_pos, tolerance):
+        k = bisect.bisect_left(self.posiciones, y_pos)
+        if k < len(self.posiciones) and abs(y_pos - self.posiciones[k]) <= tolerance:
+            return True
+        return k > 0 and abs(y_pos - self.posiciones[k-1]) <= tolerance
+
+    def mascara(self, y, tolerance):
+        """contiene() para todo el array de Y de la página"""
+        if not self.posiciones:
+            return np.zeros(len(y), dtype=bool)
+        ultimo = len(self._posiciones) - 1
+        k = np.searchsorted(self._posiciones, y, side="left")
+        derecha = np.abs(y - self._posiciones[np.minimum(k, ultimo)]) <= tolerance
+        izquierda = np.abs(y - self._posiciones[np.maximum(k - 1, 0)]) <= tolerance
+        return derecha | izquierda
@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import os
+import tempfile
+import zipfile
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class ArchivoDemasiadoGrande(Exception):
+    """El archivo subido supera config.UPLOAD_MAX_BYTES"""
+
+
+class LoteDemasiadoGrande(Exception):
+    """El lote (archivos sueltos más los PDFs de los ZIP) supera config.BATCH_MAX_FILES o config.BATCH_MAX_BYTES"""
+
+
+class PDFSubido:
+    """
+    PDF de una petición volcado a un archivo temporal. La extracción lo abre por ruta
+    (MuPDF lee del disco lo que necesita y al pool de procesos solo viaja la ruta) y
+    el SHA-256 para la cache se calcula durante la copia, sin otra lectura
+    """
+
+    def __init__(self, ruta, tamano, sha256):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.sha256 = sha256
+
+    def eliminar(self):
+        """Borra el temporal (se puede llamar más de una vez)"""
+        try:
+            os.remove(self.ruta)
+        except FileNotFoundError:
+            pass
+
+
+def guardar_subida(origen, max_bytes=None, bloque=None) -> PDFSubido:
+    """
+    Copia el archivo subido (objeto file de UploadFile) a un temporal por bloques de
+    config.UPLOAD_CHUNK_BYTES: nunca está entero en memoria. Lanza ArchivoDemasiadoGrande
+    en cuanto se supera max_bytes (sin terminar de copiar) y borra el temporal
+    """
+    max_bytes = config.UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+    bloque = bloque or config.UPLOAD_CHUNK_BYTES
+
+    descriptor, ruta = tempfile.mkstemp(prefix="pdf-", suffix=".pdf", dir=config.UPLOAD_TMP_DIR or None)
+    huella = hashlib.sha256()
+    tamano = 0
+    try:
+        with os.fdopen(descriptor, "wb") as destino:
+            while True:
+                datos = origen.read(bloque)
+                if not datos:
+                    break
+                tamano += len(datos)
+                if max_bytes and tamano > max_bytes:
+                    raise ArchivoDemasiadoGrande(f"El archivo supera el tamaño máximo de {max_bytes} bytes")
+                huella.update(datos)
+                destino.write(datos)
+    except BaseException:
+        os.remove(ruta)
+        raise
+
+    logger.debug("📥 Subida volcada a %s (%s bytes)", ruta, tamano)
+    return PDFSubido(ruta, tamano, huella.hexdigest())
+
+
+def guardar_zip(origen, nombre, max_archivos, max_bytes=None, max_total=None) -> list:
+    """
+    Vuelca a temporales los PDFs de un ZIP subido, uno a uno y por bloques (ver
+    guardar_subida). Devuelve [(nombre, PDFSubido o None, error o None)] con nombres
+    "zip/ruta/en/el/zip.pdf": un PDF que supera max_bytes o un ZIP ilegible se
+    informan como error de ese archivo. Lanza LoteDemasiadoGrande si el ZIP tiene
+    más de max_archivos PDFs o si sus PDFs ocupan más de max_total bytes (None = sin
+    límite: lo que queda del lote, para que un ZIP muy comprimido no llene el disco)
+    """
+    try:
+        archivo_zip = zipfile.ZipFile(origen)
+    except zipfile.BadZipFile as e:
+        return [(nombre, None, f"ZIP inválido: {e}")]
+
+    archivos = []
+    total = 0
+    try:
+        with archivo_zip:
+            miembros = [
+                info for info in archivo_zip.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(".pdf")
+                and not os.path.basename(info.filename).startswith(".")
+            ]
+            if len(miembros) > max_archivos:
+                raise LoteDemasiadoGrande(f"El ZIP {nombre} tiene más PDFs ({len(miembros)}) de los que admite el lote")
+            for info in miembros:
+                nombre_pdf = f"{nombre}/{info.filename}"
+                try:
+                    with archivo_zip.open(info) as miembro:
+                        subida = guardar_subida(miembro, max_bytes)
+                    archivos.append((nombre_pdf, subida, None))
+                    total += subida.tamano
+                    if max_total is not None and total > max_total:
+                        raise LoteDemasiadoGrande(f"Los PDFs del ZIP {nombre} superan el tamaño máximo del lote")
+                except ArchivoDemasiadoGrande as e:
+                    archivos.append((nombre_pdf, None, str(e)))
+                except (zipfile.BadZipFile, RuntimeError, NotImplementedError) as e:
+                    # Miembro dañado, cifrado o con compresión no soportada
+                    archivos.append((nombre_pdf, None, f"No se pudo leer del ZIP: {e}"))
+    except BaseException:
+        for _, subida, _ in archivos:
+            if subida is not None:
+                subida.eliminar()
+        raise
+    return archivos
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos de la API son planos en API-PDFS/ (se ejecuta desde ese directorio)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
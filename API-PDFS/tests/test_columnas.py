@@ -0,0 +1,73 @@
+"""
+🧭 El índice de intervalos (columnas.IndiceColumnas) debe asignar las mismas columnas
+que la regla lineal de referencia (buscar_columna_lineal), también con los perfiles
+calibrados (layouts.calibrar_layout desplaza las bandas en décimas de punto)
+
+    python -m pytest -q tests/
+"""
+import random
+
+import numpy as np
+import pytest
+
+from columnas import buscar_columna_lineal
+from perfiles import PERFILES, obtener_perfil
+
+# Las X de los spans llegan redondeadas a 0.1 (spans.TablaSpans.desde_spans)
+PASO = 0.1
+
+
+def xs_a_comprobar(indice):
+    """Rejilla de 0.1 alrededor de cada límite del índice (donde puede discrepar) y los propios límites"""
+    xs = set()
+    for punto in indice.puntos:
+        base = round(punto, 1)
+        xs.update(round(base + d * PASO, 1) for d in range(-2, 3))
+        xs.add(punto)
+    return sorted(xs)
+
+
+def comprobar(perfil):
+    indice = perfil.indice_columnas
+    xs = xs_a_comprobar(indice)
+    esperado = [buscar_columna_lineal(perfil.column_areas, x) for x in xs]
+    assert indice.buscar_todos(np.array(xs)) == esperado
+    assert [indice.buscar(x) for x in xs] == esperado
+
+
+def desplazamientos_uniformes():
+    return [round(d * PASO, 1) for d in range(-300, 301)]
+
+
+@pytest.mark.parametrize("nombre", sorted(PERFILES))
+def test_perfil_estatico_en_toda_la_rejilla(nombre):
+    perfil = obtener_perfil(nombre)
+    xs = [round(i * PASO, 1) for i in range(-500, 10000)]
+    esperado = [buscar_columna_lineal(perfil.column_areas, x) for x in xs]
+    assert perfil.indice_columnas.buscar_todos(np.array(xs)) == esperado
+
+
+@pytest.mark.parametrize("nombre", sorted(PERFILES))
+def test_perfil_desplazado_uniforme(nombre):
+    base = obtener_perfil(nombre)
+    for dx in desplazamientos_uniformes():
+        comprobar(base.desplazado({columna: dx for columna in base.column_config}))
+
+
+@pytest.mark.parametrize("nombre", sorted(PERFILES))
+def test_perfil_calibrado_por_columna(nombre):
+    base = obtener_perfil(nombre)
+    azar = random.Random(nombre)
+    for _ in range(200):
+        comprobar(base.desplazado({
+            columna: round(azar.uniform(-30, 30), 1) for columna in base.column_config
+        }))
+
+
+def test_caso_borde_tolerancia_codi():
+    # codi desplazado +12.1: x0=12.1 está justo en el borde de tolerancia de DESCRIPCION
+    base = obtener_perfil("codi")
+    perfil = base.desplazado({columna: 12.1 for columna in base.column_config})
+    esperado = buscar_columna_lineal(perfil.column_areas, 12.1)
+    assert perfil.indice_columnas.buscar(12.1) == esperado
+    assert perfil.indice_columnas.buscar_todos(np.array([12.1])) == [esperado]
@@ -0,0 +1,52 @@
+"""
+⏱️ Presupuesto de importación: main.py (y los extractores) no deben volver a cargar
+dependencias pesadas al importarse. Se importan en un subproceso limpio para que ni
+pytest ni otros tests hayan dejado los módulos en sys.modules
+
+    python -m pytest -q tests/
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+DIRECTORIO_API = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Segundos máximos para "import main" (margen amplio: FastAPI + PyMuPDF tardan <1 s)
+PRESUPUESTO_SEGUNDOS = float(os.getenv("PDF_IMPORT_BUDGET_SECONDS", "5"))
+
+MODULOS_PESADOS = ("sklearn", "cv2", "camelot", "pytesseract")
+
+SCRIPT = """
+import sys, time
+inicio = time.perf_counter()
+import {modulo}
+transcurrido = time.perf_counter() - inicio
+pesados = [m for m in {pesados!r} if m in sys.modules]
+print(transcurrido)
+print(",".join(pesados))
+"""
+
+
+def importar(modulo):
+    """(segundos, módulos pesados cargados) al importar modulo en un intérprete nuevo"""
+    resultado = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(modulo=modulo, pesados=MODULOS_PESADOS)],
+        cwd=DIRECTORIO_API, capture_output=True, text=True,
+        timeout=PRESUPUESTO_SEGUNDOS * 4,
+    )
+    assert resultado.returncode == 0, resultado.stderr
+    segundos, pesados = resultado.stdout.splitlines()[-2:]
+    return float(segundos), [m for m in pesados.split(",") if m]
+
+
+def test_importar_main_dentro_del_presupuesto():
+    segundos, _ = importar("main")
+    assert segundos < PRESUPUESTO_SEGUNDOS, f"import main tardó {segundos:.2f} s"
+
+
+@pytest.mark.parametrize("modulo", ["main", "extractor", "extractor_filtro_2"])
+def test_sin_dependencias_pesadas(modulo):
+    _, pesados = importar(modulo)
+    assert pesados == [], f"import {modulo} cargó {pesados}"
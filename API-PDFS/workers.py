@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from starlette.concurrency import run_in_threadpool
+
+import config
+import pipeline
+from logs import configurar_logging
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+class ExtractionTimeout(Exception):
+    """La extracción superó el tiempo máximo configurado (config.JOB_TIMEOUT)"""
+
+
+def get_executor():
+    """Devuelve el pool de procesos compartido, creándolo en el primer uso"""
+    global _executor
+
+    if _executor is None:
+        # "spawn" es obligatorio con max_tasks_per_child y evita heredar los hilos de uvicorn
+        _executor = ProcessPoolExecutor(
+            max_workers=config.POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=config.POOL_MAX_TASKS_PER_CHILD,
+            initializer=configurar_logging,
+        )
+        logger.info("⚙️ Pool de extracción iniciado: %s procesos", config.POOL_WORKERS)
+
+    return _executor
+
+
+def shutdown_executor(executor=None):
+    """
+    Detiene el pool de procesos (al apagar la aplicación). executor: solo ese pool (uno
+    roto); si ya se sustituyó por otro, el pool compartido actual no se toca
+    """
+    global _executor
+
+    if executor is None:
+        executor = _executor
+    if executor is None:
+        return
+    if executor is _executor:
+        _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def ejecutar(func, *args):
+    """Ejecuta func(*args) fuera del event loop según config.EXECUTION_MODE"""
+    if config.EXECUTION_MODE == "thread":
+        try:
+            return await asyncio.wait_for(run_in_threadpool(func, *args), config.JOB_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise ExtractionTimeout(f"La extracción superó {config.JOB_TIMEOUT:g}s")
+
+    executor = get_executor()
+    try:
+        future = executor.submit(func, *args)
+    except BrokenProcessPool:
+        # Un proceso murió cuando nadie esperaba su trabajo (p.ej. tras un timeout): el
+        # pool ya no acepta trabajos; se recrea y se reintenta una vez
+        logger.warning("⚠️ Pool de extracción roto: se recrea")
+        shutdown_executor(executor)
+        executor = get_executor()
+        future = executor.submit(func, *args)
+
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), config.JOB_TIMEOUT)
+    except asyncio.TimeoutError:
+        # Un trabajo ya iniciado no se puede interrumpir; el proceso queda ocupado hasta terminar
+        future.cancel()
+        raise ExtractionTimeout(f"La extracción superó {config.JOB_TIMEOUT:g}s")
+    except BrokenProcessPool:
+        # Un proceso murió (p.ej. falta de memoria): recrear el pool para las siguientes peticiones
+        shutdown_executor(executor)
+        raise
+
+
+async def procesar_documento(pdf, paginas=None, max_registros=None) -> dict:
+    """
+    Detección + extracción en el pool. Los documentos grandes (config.PARALLEL_MIN_PAGES
+    páginas seleccionadas) se reparten por tramos de páginas entre todos los procesos y
+    se unen en orden. Con max_registros la extracción es secuencial para poder
+    detenerse en cuanto se alcanza el cupo. pdf: ruta del PDF subido (o bytes); con
+    la ruta, a cada proceso solo viaja la ruta y no el contenido del archivo
+    """
+    paralelo = config.EXECUTION_MODE == "process" and config.POOL_WORKERS > 1 and max_registros is None
+    min_paginas = config.PARALLEL_MIN_PAGES if paralelo else None
+
+    resultado = await ejecutar(pipeline.procesar_pdf, pdf, min_paginas, paginas, max_registros)
+    if resultado["data"] is not None:
+        return resultado
+
+    tiene_codi = resultado["tiene_codi"]
+    tramos = pipeline.dividir_paginas(resultado["seleccion"], config.POOL_WORKERS)
+    partes = await asyncio.gather(*(
+        ejecutar(pipeline.extraer_paginas, pdf, tramo, resultado["layout"])
+        for tramo in tramos
+    ))
+    resultados = pipeline.unir_resultados(partes)
+
+    return {
+        "paginas": resultado["paginas"],
+        "seleccion": resultado["seleccion"],
+        "tiene_codi": tiene_codi,
+        "extraction_method": pipeline.metodo_extraccion(tiene_codi),
+        "statistics": pipeline.calcular_estadisticas(resultados, tiene_codi),
+        "data": resultados
+    }
+
+
+async def iniciar_documento(pdf, paginas=None) -> dict:
+    """Solo el layout (páginas + CODI + layout + páginas seleccionadas), para el modo streaming"""
+    return await ejecutar(pipeline.procesar_pdf, pdf, 1, paginas)
+
+
+async def iterar_paginas(pdf, paginas, layout=None):
+    """
+    Genera (pagina, registros) en orden de página para las páginas indicadas. Los
+    tramos de config.STREAM_PAGES_PER_JOB páginas se envían al pool con una ventana
+    acotada de trabajos en curso, para que la memoria no crezca con el número de páginas.
+    layout: el "layout" de iniciar_documento, con el que empieza cada tramo
+    """
+    partes = -(-len(paginas) // config.STREAM_PAGES_PER_JOB)
+    tramos = pipeline.dividir_paginas(paginas, partes)
+    ventana = max(1, config.POOL_WORKERS * 2)
+    en_curso = []
+
+    try:
+        for tramo in tramos:
+            en_curso.append(asyncio.ensure_future(
+                ejecutar(pipeline.extraer_paginas, pdf, tramo, layout)
+            ))
+            if len(en_curso) >= ventana:
+                for pagina in await en_curso.pop(0):
+                    yield pagina
+
+        while en_curso:
+            for pagina in await en_curso.pop(0):
+                yield pagina
+    finally:
+        # Cliente desconectado o error: no dejar trabajos pendientes en el pool
+        for tarea in en_curso:
+            tarea.cancel()